@@ -37,6 +37,7 @@ setup(name='node.ext.ldap',
           'test': [
               'interlude',
               'plone.testing',
+              'pyasn1',
               'unittest2',
               'zope.configuration',
               'zope.testing',
@@ -15,6 +15,8 @@ from .base import (
 )
 from .schema import LDAPSchemaInfo
 from .session import LDAPSession
+from .asyncsession import AsyncLDAPSession
+from .sync import SyncListener
 from ._node import (
     LDAPNodeAttributes,
     LDAPStorage,
@@ -58,6 +58,9 @@ ACTION_ADD = 0
 ACTION_MODIFY = 1
 ACTION_DELETE = 2
 
+# maximum number of outstanding requests when committing in batches
+BATCH_WINDOW = 100
+
 
 class AttributesBehavior(Behavior):
 
@@ -73,7 +76,12 @@ class AttributesBehavior(Behavior):
           or self.parent._action == ACTION_ADD:
             return
 
-        self.clear()
+        # attributes fetched by ``prefetch`` of parent node
+        prefetched = self.parent._prefetched
+        if prefetched is not None:
+            self.parent._prefetched = None
+            self.populate(prefetched)
+            return
 
         attrlist = ['*']
 
@@ -98,7 +106,13 @@ class AttributesBehavior(Behavior):
                 u"Fatal. Expected entry does not exist or " #pragma NO COVERAGE
                 u"more than one entry found")               #pragma NO COVERAGE
 
-        attrs = entry[0][1]
+        self.populate(entry[0][1])
+
+    @default
+    def populate(self, attrs):
+        """Set attributes from search result entry attributes ``attrs``.
+        """
+        self.clear()
         for key, item in attrs.items():
             if len(item) == 1 and not self.is_multivalued(key):
                 self[key] = item[0]
@@ -185,6 +199,7 @@ class LDAPStorage(OdictStorage):
         self._action = None
         self._seckey_attrs = None
         self._reload = False
+        self._prefetched = None
         self._init_keys()
         self._multivalued_attributes = {}
         self._binary_attributes = {}
@@ -266,7 +281,12 @@ class LDAPStorage(OdictStorage):
         val._ldap_session = self.ldap_session
 
         if self._keys is None:
-            self._load_keys()
+            if self._action == ACTION_ADD:
+                # self is not in the directory yet, no children to load
+                self._keys = odict()
+                self._child_dns = {}
+            else:
+                self._load_keys()
         try:
             # a value with key is already in the directory
             self._keys[key]
@@ -328,7 +348,21 @@ class LDAPStorage(OdictStorage):
             return iter(list())
 
     @finalize
-    def __call__(self):
+    def __call__(self, batch=False):
+        """Write pending changes to the directory.
+
+        batch
+            Flag whether to commit the changes of the whole tree in batches.
+            Additions and modifications are written level by level top-down,
+            deletions level by level bottom-up. Operations of one level do
+            not depend on each other and get pipelined on one connection, see
+            ``LDAPSession.batch``. If operations fail, the remaining
+            operations of the level are written anyway and the first error is
+            raised afterwards.
+        """
+        if batch:
+            self._batch_commit()
+            return
         if self.changed and self._action is not None:
             if self._action == ACTION_ADD:
                 self._ldap_add()
@@ -336,12 +370,7 @@ class LDAPStorage(OdictStorage):
                 self._ldap_modify()
             elif self._action == ACTION_DELETE:
                 self._ldap_delete()
-            try:
-                self.nodespaces['__attrs__'].changed = False
-            except KeyError:
-                pass
-            self.changed = False
-            self._action = None
+            self._committed()
         if self._keys is None:
             return
         for node in self.storage.values() + getattr(self, '_deleted', []):
@@ -451,7 +480,106 @@ class LDAPStorage(OdictStorage):
     def search(self, queryFilter=None, criteria=None, attrlist=None,
                relation=None, relation_node=None, exact_match=False,
                or_search=False, or_keys=None, or_values=None,
-               page_size=None, cookie=None):
+               page_size=None, cookie=None, sort_keys=None, offset=None,
+               count=None):
+        _filter, attrset = self._search_query(
+            queryFilter, criteria, attrlist, relation, relation_node,
+            or_search, or_keys, or_values)
+
+        # perform the backend search
+        matches = self.ldap_session.search(
+            str(_filter),
+            self.search_scope,
+            baseDN=encode(self.DN),
+            force_reload=self._reload,
+            attrlist=list(attrset),
+            page_size=page_size,
+            cookie=cookie,
+            sort_keys=sort_keys,
+            offset=offset,
+            count=count,
+            )
+        total = None
+        if type(matches) is tuple:
+            if count is not None:
+                matches, total = matches
+            else:
+                matches, cookie = matches
+
+        # XXX: Is ValueError appropriate?
+        # XXX: why do we need to fail at all? shouldn't this be about
+        # substring vs equality match?
+        if exact_match and len(matches) > 1:
+            raise ValueError(u"Exact match asked but result not unique")
+        if exact_match and len(matches) == 0:
+            raise ValueError(u"Exact match asked but result length is zero")
+
+        # extract key and desired attributes
+        res = [self._search_result(dn, attrs, attrlist)
+               for dn, attrs in matches]
+        if cookie is not None:
+            return (res, cookie)
+        if total is not None:
+            return (res, total)
+        return res
+
+    @default
+    def iter_search(self, queryFilter=None, criteria=None, attrlist=None,
+                    relation=None, relation_node=None, or_search=False,
+                    or_keys=None, or_values=None, page_size=None):
+        _filter, attrset = self._search_query(
+            queryFilter, criteria, attrlist, relation, relation_node,
+            or_search, or_keys, or_values)
+        matches = self.ldap_session.iter_search(
+            str(_filter),
+            self.search_scope,
+            baseDN=encode(self.DN),
+            attrlist=list(attrset),
+            page_size=page_size,
+            )
+        for dn, attrs in matches:
+            yield self._search_result(dn, attrs, attrlist)
+
+    @default
+    def prefetch(self):
+        """Load attributes of all children with one search.
+
+        Attributes of children get populated from the search result instead
+        of searching each child entry on first access of ``attrs``. Walks all
+        pages if a page size is configured. Children with pending changes are
+        skipped.
+        """
+        if self.name is None or self._action == ACTION_ADD:
+            return
+        if self._keys is None:
+            self._load_keys()
+        _filter, attrset = self._search_query(
+            None, None, ['*'], None, None, False, None, None)
+        matches = self.ldap_session.iter_search(
+            str(_filter),
+            self.search_scope,
+            baseDN=encode(self.DN),
+            attrlist=list(attrset),
+            )
+        for dn, attrs in matches:
+            key = self._calculate_key(dn, attrs)
+            if key not in self._keys:
+                continue
+            child = self[key]
+            if child.changed or child._action is not None:
+                continue
+            # loading the child entry elsewhere is served from cache
+            self.ldap_session.cache_entry(dn, attrs)
+            if '__attrs__' in child.nodespaces:
+                child.attrs.populate(attrs)
+            else:
+                child._prefetched = attrs
+
+    @default
+    def _search_query(self, queryFilter, criteria, attrlist, relation,
+                      relation_node, or_search, or_keys, or_values):
+        """Return query filter and set of attributes to fetch for search.
+        """
         attrset = set(attrlist or [])
         attrset.discard('dn')
 
@@ -487,48 +615,25 @@ class LDAPStorage(OdictStorage):
         # would it be better to fail? (see also __iter__ secondary key)
         if self._key_attr != 'rdn' and self._key_attr not in _filter:
             _filter &= '(%s=*)' % (self._key_attr,)
+        return _filter, attrset
 
-        # perform the backend search
-        matches = self.ldap_session.search(
-            str(_filter),
-            self.search_scope,
-            baseDN=encode(self.DN),
-            force_reload=self._reload,
-            attrlist=list(attrset),
-            page_size=page_size,
-            cookie=cookie,
-            )
-        if type(matches) is tuple:
-            matches, cookie = matches
-
-        # XXX: Is ValueError appropriate?
-        # XXX: why do we need to fail at all? shouldn't this be about
-        # substring vs equality match?
-        if exact_match and len(matches) > 1:
-            raise ValueError(u"Exact match asked but result not unique")
-        if exact_match and len(matches) == 0:
-            raise ValueError(u"Exact match asked but result length is zero")
-
-        # extract key and desired attributes
-        res = []
-        for dn, attrs in matches:
-            key = self._calculate_key(dn, attrs)
-            if attrlist is not None:
-                resattr = dict()
-                for k, v in attrs.iteritems():
-                    if k in attrlist:
-                        if self.attrs.is_binary(k):
-                            resattr[decode(k)] = v
-                        else:
-                            resattr[decode(k)] = decode(v)
-                if 'dn' in attrlist:
-                    resattr[u'dn'] = decode(dn)
-                res.append((key, resattr))
-            else:
-                res.append(key)
-        if cookie is not None:
-            return (res, cookie)
-        return res
+    @default
+    def _search_result(self, dn, attrs, attrlist):
+        """Return key or ``(key, attrdict)`` for search result entry.
+        """
+        key = self._calculate_key(dn, attrs)
+        if attrlist is None:
+            return key
+        resattr = dict()
+        for k, v in attrs.iteritems():
+            if k in attrlist:
+                if self.attrs.is_binary(k):
+                    resattr[decode(k)] = v
+                else:
+                    resattr[decode(k)] = decode(v)
+        if 'dn' in attrlist:
+            resattr[u'dn'] = decode(dn)
+        return (key, resattr)
 
     @default
     def invalidate(self, key=None):
@@ -596,7 +701,12 @@ class LDAPStorage(OdictStorage):
         if self._seckey_attrs:
             self._seckeys = dict()
             attrlist.extend(self._seckey_attrs)
-        for key, attrs in self.search(attrlist=attrlist):
+        if self.ldap_session.page_size:
+            # walk all pages, containers might exceed server size limit
+            results = self.iter_search(attrlist=attrlist)
+        else:
+            results = self.search(attrlist=attrlist)
+        for key, attrs in results:
             try:
                 self._keys[key]
             except KeyError:
@@ -671,20 +781,123 @@ class LDAPStorage(OdictStorage):
         return node
 
     @default
-    def _ldap_add(self):
-        """adds self to the ldap directory.
+    def _committed(self):
+        """reset pending action and changed flags after writing self.
+
+        Written attributes replace the cached result of loading them, so
+        reading them again does not require a server round trip.
+        """
+        if self._action in [ACTION_ADD, ACTION_MODIFY] \
+          and '__attrs__' in self.nodespaces:
+            attrs = dict()
+            for key, value in self._ldap_entry().items():
+                if not isinstance(value, list):
+                    value = [value]
+                attrs[key] = value
+            self.ldap_session.cache_entry(encode(self.DN), attrs)
+        try:
+            self.nodespaces['__attrs__'].changed = False
+        except KeyError:
+            pass
+        self.changed = False
+        self._action = None
+
+    @default
+    def _collect_changes(self, levels, depth=0):
+        """collect nodes with pending action per tree level in ``levels``.
+        """
+        if self.changed and self._action is not None:
+            levels.setdefault(depth, list()).append(self)
+        if self._keys is None:
+            return
+        seen = set()
+        for node in self.storage.values() + getattr(self, '_deleted', []):
+            # deleted nodes remain in storage until written
+            if node.changed and id(node) not in seen:
+                seen.add(id(node))
+                node._collect_changes(levels, depth + 1)
+
+    @default
+    def _batch_commit(self):
+        """write pending changes of tree in batches per tree level.
+        """
+        levels = dict()
+        self._collect_changes(levels)
+        batches = list()
+        for depth in sorted(levels):
+            batches.append([node for node in levels[depth]
+                            if node._action != ACTION_DELETE])
+        for depth in sorted(levels, reverse=True):
+            batches.append([node for node in levels[depth]
+                            if node._action == ACTION_DELETE])
+        for nodes in batches:
+            operations = list()
+            pending = list()
+            for node in nodes:
+                operation = node._ldap_operation()
+                if operation is None:
+                    node._committed()
+                    continue
+                operations.append(operation)
+                pending.append(node)
+            if not operations:
+                continue
+            error = None
+            results = self.ldap_session.batch(operations, window=BATCH_WINDOW)
+            for node, (dn, node_error) in zip(pending, results):
+                if node_error is not None:
+                    if error is None:
+                        error = node_error
+                    continue
+                if node._action == ACTION_DELETE:
+                    node._detach_deleted()
+                node._committed()
+            if error is not None:
+                raise error
+
+    @default
+    def _ldap_operation(self):
+        """operation tuple for ``LDAPSession.batch`` writing pending action
+        of self, or None if there is nothing to write.
+        """
+        if self._action == ACTION_ADD:
+            return ('add', encode(self.DN), self._ldap_entry())
+        if self._action == ACTION_MODIFY:
+            modlist = self._ldap_modlist()
+            if modlist:
+                return ('modify', encode(self.DN), modlist)
+            return None
+        return ('delete', encode(self.DN))
+
+    @default
+    def _ldap_entry(self):
+        """attributes of self as expected by ``LDAPSession.add``.
         """
         attrs = {}
         for key, value in self.attrs.items():
             if not self.attrs.is_binary(key):
                 value = encode(value)
             attrs[encode(key)] = value
-        self.ldap_session.add(encode(self.DN), attrs)
+        return attrs
+
+    @default
+    def _ldap_add(self):
+        """adds self to the ldap directory.
+        """
+        self.ldap_session.add(encode(self.DN), self._ldap_entry())
 
     @default
     def _ldap_modify(self):
         """modifies attributs of self on the ldap directory.
         """
+        modlist = self._ldap_modlist()
+        if modlist:
+            self.ldap_session.modify(encode(self.DN), modlist)
+
+    @default
+    def _ldap_modlist(self):
+        """modlist of changed attributes of self.
+        """
         modlist = list()
         orgin = self.attributes_factory(name='__attrs__', parent=self)
 
@@ -705,17 +918,22 @@ class LDAPStorage(OdictStorage):
             elif self.attrs[key] != orgin[key]:
                 moddef = (MOD_REPLACE, encode(key), value)
                 modlist.append(moddef)
-        if modlist:
-            self.ldap_session.modify(encode(self.DN), modlist)
+        return modlist
 
     @default
     def _ldap_delete(self):
         """delete self from the ldap-directory.
         """
+        self._detach_deleted()
+        self.ldap_session.delete(encode(self.DN))
+
+    @default
+    def _detach_deleted(self):
+        """remove deleted self from parent.
+        """
         self.parent._keys[self.name] = False
         del self.parent.storage[self.name]
         del self.parent._keys[self.name]
-        self.ldap_session.delete(encode(self.DN))
 
     @default
     @property
@@ -0,0 +1,322 @@
+# -*- coding: utf-8 -*-
+import ldap
+import select
+import time
+from . import (
+    BASE,
+    LDAPCommunicator,
+    LDAPConnector,
+)
+
+
+class LDAPOperation(object):
+    """Handle of an LDAP operation executed asynchronously.
+
+    Operations get completed by polling the session they were issued on,
+    either via ``AsyncLDAPSession.poll`` or by waiting for the ``result``.
+    """
+
+    def __init__(self, session, con, msgid, finish=None):
+        """
+        session
+            ``AsyncLDAPSession`` instance the operation was issued on.
+
+        con
+            Connection the operation was sent on.
+
+        msgid
+            Message id of the request.
+
+        finish
+            Optional callable converting the response. Gets called with
+            response data and the ``ldap.LDAPError`` raised for the operation
+            or None. Returns the operation result or raises.
+        """
+        self._session = session
+        self._con = con
+        self.msgid = msgid
+        self._finish = finish
+        self._done = False
+        self._value = None
+        self._error = None
+        self._callbacks = list()
+
+    def done(self):
+        """Flag whether operation has been completed.
+        """
+        return self._done
+
+    def result(self, timeout=None):
+        """Return result of operation.
+
+        Wait for the response if operation is not completed yet. If
+        ``timeout`` is given, raise ``ldap.TIMEOUT`` if the response does not
+        arrive within ``timeout`` seconds. Raise the ``ldap.LDAPError`` the
+        operation failed with.
+        """
+        if not self._done:
+            self._poll(timeout is None and -1 or timeout)
+            if not self._done:
+                raise ldap.TIMEOUT({'desc': "LDAP operation not completed"})
+        if self._error is not None:
+            raise self._error
+        return self._value
+
+    def add_done_callback(self, callback):
+        """Register callable to be called with this operation when completed.
+        Called immediately if operation is already completed.
+        """
+        if self._done:
+            callback(self)
+            return
+        self._callbacks.append(callback)
+
+    def cancel(self):
+        """Abandon the operation. Return False if already completed.
+        """
+        if self._done:
+            return False
+        try:
+            self._con.abandon(self.msgid)
+        except ldap.LDAPError:
+            pass
+        self._error = ldap.USER_CANCELLED({'desc': "LDAP operation abandoned"})
+        self._completed()
+        return True
+
+    def _poll(self, timeout=0):
+        """Complete operation if its response has arrived. Wait up to
+        ``timeout`` seconds, -1 means wait until response arrives.
+        """
+        try:
+            rtype, rdata, rmsgid, rctrls = \
+                self._con.result3(self.msgid, all=1, timeout=timeout)
+        except ldap.TIMEOUT:
+            return
+        except ldap.LDAPError, e:
+            self._complete(None, e)
+            return
+        if rtype is None:
+            # response not arrived yet
+            return
+        self._complete(rdata, None)
+
+    def _complete(self, rdata, error):
+        try:
+            if self._finish is not None:
+                self._value = self._finish(rdata, error)
+            elif error is not None:
+                raise error
+            else:
+                self._value = rdata
+        except ldap.LDAPError, e:
+            self._error = e
+        self._completed()
+
+    def _completed(self):
+        self._done = True
+        self._session._forget(self)
+        for callback in self._callbacks:
+            callback(self)
+
+
+class AsyncLDAPSession(object):
+    """LDAP session executing operations asynchronously.
+
+    Operations are sent without waiting for the response and return an
+    ``LDAPOperation`` handle. Any number of operations may be in flight on
+    the single connection of the session. Responses are collected by calling
+    ``poll``, e.g. from an event loop when the file descriptor returned by
+    ``fileno`` becomes readable.
+
+    all strings must be utf8 encoded!
+    """
+
+    def __init__(self, props):
+        self._props = props
+        self._connector = LDAPConnector(props=props)
+        # invalidates cached search results of synchronous sessions
+        self._communicator = LDAPCommunicator(self._connector)
+        self._con = None
+        self._pending = list()
+        self.baseDN = ''
+
+    @property
+    def pending(self):
+        """Number of operations not completed yet.
+        """
+        return len(self._pending)
+
+    def fileno(self):
+        """File descriptor of the session connection. Binds if not bound yet.
+
+        Credential checks via ``authenticate`` run on separate connections,
+        thus ``poll`` should also be called periodically while those are
+        pending. Requires python-ldap >= 2.4.19.
+        """
+        if getattr(ldap, 'OPT_DESC', None) is None:
+            raise RuntimeError(                             #pragma NO COVERAGE
+                u"fileno requires python-ldap >= 2.4.19")   #pragma NO COVERAGE
+        return self._connection().get_option(ldap.OPT_DESC)
+
+    def poll(self, timeout=0):
+        """Complete operations whose responses have arrived and return them.
+
+        Responses are collected until none is left. If no response is
+        available, wait up to ``timeout`` seconds for the first one to
+        arrive.
+        """
+        deadline = time.time() + timeout
+        completed = list()
+        while True:
+            done = list()
+            for operation in list(self._pending):
+                operation._poll()
+                if operation.done():
+                    done.append(operation)
+            completed += done
+            if done:
+                # more responses may have arrived meanwhile
+                continue
+            remaining = deadline - time.time()
+            if completed or not self._pending or remaining <= 0:
+                return completed
+            self._wait(remaining)
+
+    def unbind(self):
+        """Abandon pending operations and unbind from server.
+        """
+        for operation in list(self._pending):
+            operation.cancel()
+        if self._con is not None:
+            try:
+                self._con.unbind_s()
+            finally:
+                self._con = None
+
+    def search(self, queryFilter='(objectClass=*)', scope=BASE, baseDN=None,
+               attrlist=None, attrsonly=0):
+        """Search the directory. Result of the operation is the list of
+        ``(dn, attrs)`` tuples. Arguments are the same as for
+        ``LDAPSession.search``.
+        """
+        if queryFilter in ('', u'', None):
+            queryFilter = '(objectClass=*)'
+        if baseDN is None:
+            baseDN = self.baseDN
+            if not baseDN:
+                raise ValueError(u"baseDN unset.")
+
+        def finish(rdata, error):
+            if error is not None:
+                raise error
+            # ActiveDirectory returns entries with dn None
+            return [entry for entry in rdata if entry[0] is not None]
+
+        return self._submit('search_ext', finish, baseDN, scope, queryFilter,
+                            attrlist, attrsonly)
+
+    def add(self, dn, data):
+        """Insert an entry into directory.
+        """
+        attributes = [(k, v) for k, v in data.items()]
+        return self._submit_write('add_ext', dn, attributes)
+
+    def modify(self, dn, modlist):
+        """Modify an existing entry in the directory, see
+        ``LDAPCommunicator.modify``.
+        """
+        return self._submit_write('modify_ext', dn, modlist)
+
+    def delete(self, dn):
+        """Delete an entry from the directory.
+        """
+        return self._submit_write('delete_ext', dn)
+
+    def passwd(self, userdn, oldpw, newpw):
+        """Change password of user.
+        """
+        return self._submit_write('passwd', userdn, oldpw, newpw)
+
+    def authenticate(self, dn, pw):
+        """Verify credentials on a separate connection, the session stays
+        bound. Result of the operation is a boolean.
+        """
+        con = self._connector.connect(bind=False)
+
+        def finish(rdata, error):
+            try:
+                con.unbind_s()
+            except ldap.LDAPError:
+                pass
+            if isinstance(error, ldap.INVALID_CREDENTIALS):
+                return False
+            if error is not None:
+                raise error
+            return True
+
+        try:
+            msgid = con.simple_bind(dn, pw)
+        except ldap.LDAPError:
+            con.unbind_s()
+            raise
+        return self._track(LDAPOperation(self, con, msgid, finish))
+
+    def _connection(self):
+        if self._con is None:
+            self._con = self._connector.connect()
+        return self._con
+
+    def _submit(self, name, finish, *args):
+        con = self._connection()
+        try:
+            msgid = getattr(con, name)(*args)
+        except ldap.SERVER_DOWN:
+            # connection is dead, bind again on next operation
+            self._con = None
+            raise
+        return self._track(LDAPOperation(self, con, msgid, finish))
+
+    def _submit_write(self, name, dn, *args):
+        operation = self._submit(name, self._finish_write, dn, *args)
+
+        def invalidate(operation):
+            # abandoned writes may have been applied anyway
+            if operation._error is None \
+              or isinstance(operation._error, ldap.USER_CANCELLED):
+                self._communicator.invalidate(dn)
+
+        operation.add_done_callback(invalidate)
+        return operation
+
+    def _track(self, operation):
+        self._pending.append(operation)
+        return operation
+
+    def _forget(self, operation):
+        if operation in self._pending:
+            self._pending.remove(operation)
+        if isinstance(operation._error, ldap.SERVER_DOWN) \
+          and operation._con is self._con:
+            self._con = None
+
+    def _finish_write(self, rdata, error):
+        if error is not None:
+            raise error
+
+    def _wait(self, timeout):
+        """Wait up to ``timeout`` seconds for data on pending connections.
+        """
+        opt_desc = getattr(ldap, 'OPT_DESC', None)
+        if opt_desc is None:
+            time.sleep(min(timeout, 0.01))                  #pragma NO COVERAGE
+            return                                          #pragma NO COVERAGE
+        fds = set()
+        for operation in self._pending:
+            try:
+                fds.add(operation._con.get_option(opt_desc))
+            except ldap.LDAPError:
+                # connection not established yet
+                time.sleep(min(timeout, 0.01))
+                return
+        select.select(list(fds), [], [], timeout)
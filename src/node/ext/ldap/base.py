@@ -1,11 +1,59 @@
 # -*- coding: utf-8 -*-
 import ldap
+import ldap.dn
 import logging
+import os
+import random
+import time
+import weakref
+from contextlib import contextmanager
+from hashlib import md5 as _md5
+from ldap.filter import escape_filter_chars
 from zope.component import queryUtility
-from bda.cache import ICacheManager
+from bda.cache import (
+    ICacheManager,
+    NullCache,
+)
 from .interfaces import ICacheProviderFactory
 from .properties import LDAPProps
-from .cache import nullcacheProviderFactory
+from .cache import (
+    cache_index,
+    cache_refresher,
+    cache_stats,
+    get_multi,
+    negative_cache,
+    normalize_dn,
+    normalize_filter,
+    nullcacheProviderFactory,
+    search_flight,
+    search_tags,
+    set_multi,
+    write_tags,
+)
+from .pool import (
+    authentication_pool,
+    connection_pool,
+    keep_inherited,
+)
+from .health import server_health
+from .scope import (
+    BASE,
+    ONELEVEL,
+)
+try:
+    from ldap.controls.sss import SSSRequestControl
+except ImportError:                                         #pragma NO COVERAGE
+    # python-ldap < 2.4.22                                  #pragma NO COVERAGE
+    SSSRequestControl = None                                #pragma NO COVERAGE
+try:
+    from ldap.controls.vlv import (
+        VLVRequestControl,
+        VLVResponseControl,
+    )
+except ImportError:                                         #pragma NO COVERAGE
+    # python-ldap < 2.4.22                                  #pragma NO COVERAGE
+    VLVRequestControl = None                                #pragma NO COVERAGE
+    VLVResponseControl = None                               #pragma NO COVERAGE
 
 
 logger = logging.getLogger('node.ext.ldap')
@@ -27,29 +75,40 @@ def testLDAPConnectivity(server=None, port=None, props=None):
         props = LDAPProps(server=server, port=port)
     try:
         c = LDAPConnector(props=props)
-        lc = LDAPCommunicator(c)
-        lc.bind()
-        lc.unbind()
+        c.bind()
+        c.unbind()
         return 'success'
     except ldap.LDAPError, error:
         return error
 
 
-def md5digest(key):
-    """Needed to support both, python 2.4 and python >=2.5
+_registered_caches = weakref.WeakKeyDictionary()
+
 
-    Will be remove when python 2.4 support is dropped.
+def registered_cache():
+    """Return cache manager of the cache provider created by the registered
+    ``ICacheProviderFactory`` utility, or None if no utility is registered or
+    the provider does not cache.
     """
+    cachefactory = queryUtility(ICacheProviderFactory)
+    if cachefactory is None:
+        return None
     try:
-        # in python >=2.5
-        import hashlib
-    except ImportError:                                     #pragma NO COVERAGE
-        # fallback if python 2.4
-        import md5                                          #pragma NO COVERAGE
-        return md5.new(key).hexdigest()                     #pragma NO COVERAGE
-    m = hashlib.md5()
-    m.update(key)
-    return m.hexdigest()
+        return _registered_caches[cachefactory]
+    except KeyError:
+        pass
+    cacheprovider = cachefactory()
+    cache = None
+    if not isinstance(cacheprovider, NullCache):
+        cache = ICacheManager(cacheprovider)
+    _registered_caches[cachefactory] = cache
+    return cache
+
+
+def md5digest(key):
+    """Return hex encoded md5 digest of ``key``.
+    """
+    return _md5(key).hexdigest()
 
 
 def decode_utf8(value):
@@ -81,12 +140,17 @@ class LDAPConnector(object):
                  bindPW=None,
                  cache=True,
                  cachetimeout=43200,
-                 props=None):
+                 props=None,
+                 uris=None):
         """Initialize LDAPConnector.
 
         Signature Deprecated: Signature will take ``LDAPProps``
                               object only instead of current kwargs in future.
                               This will be changed in Version 1.0.
+
+        uris
+            Ordered list of LDAP URIs to connect to, overriding the URIs of
+            ``props``. Used for connecting to read replicas.
         """
         self.protocol = ldap.VERSION3
         if props is None:
@@ -95,30 +159,148 @@ class LDAPConnector(object):
                          u"please pass ``LDAPProps`` object instead of "
                          u"separate settings.")
             self._uri = "ldap://%s:%d/" % (server, port)
+            self._uris = [self._uri]
             self._bindDN = bindDN
             self._bindPW = bindPW
             self._cache = cache
             self._cachetimeout = cachetimeout
             self._start_tls = 0
+            self._retry_max = 1
+            self._retry_delay = 0
+            self._pool_size = 0
+            self._pool_min_size = 0
+            self._pool_timeout = None
+            self._pool_check = True
+            self._pool_check_idle = 30
+            self._pool_idle_timeout = None
+            self._pool_max_lifetime = None
+            self._pool_keepalive = None
+            self._auth_pool_size = 0
+            self._circuit_threshold = 0
+            self._circuit_timeout = 30.0
+            self._load_balancing = False
+            self._cache_stale = 0
+            self._cache_jitter = 0.0
+            self._negative_timeout = 0
         else:
             # new
             self._uri = props.uri
+            self._uris = getattr(props, 'uris', None) or [self._uri]
             self._bindDN = props.user
             self._bindPW = props.password
             self._cache = props.cache
             self._cachetimeout = props.timeout
             self._start_tls = props.start_tls
+            self._retry_max = props.retry_max
+            self._retry_delay = props.retry_delay
+            self._pool_size = getattr(props, 'pool_size', 0)
+            self._pool_min_size = getattr(props, 'pool_min_size', 0)
+            self._pool_timeout = getattr(props, 'pool_timeout', None)
+            self._pool_check = getattr(props, 'pool_check', True)
+            self._pool_check_idle = getattr(props, 'pool_check_idle', 30)
+            self._pool_idle_timeout = getattr(props, 'pool_idle_timeout', None)
+            self._pool_max_lifetime = getattr(props, 'pool_max_lifetime', None)
+            self._pool_keepalive = getattr(props, 'pool_keepalive', None)
+            self._auth_pool_size = getattr(props, 'auth_pool_size', 0)
+            self._circuit_threshold = getattr(props, 'circuit_threshold', 0)
+            self._circuit_timeout = getattr(props, 'circuit_timeout', 30.0)
+            self._load_balancing = getattr(props, 'load_balancing', False)
+            self._cache_stale = getattr(props, 'cache_stale', 0)
+            self._cache_jitter = getattr(props, 'cache_jitter', 0.0)
+            self._negative_timeout = getattr(props, 'negative_timeout', 0)
+        if uris:
+            self._uri = uris[0]
+            self._uris = list(uris)
+
+    def connect(self, bind=True):
+        """Create a new connection and return it.
+
+        In contrast to ``bind``, the connection is not remembered on the
+        connector.
+
+        bind
+            Flag whether to bind the connection with configured credentials.
+
+        Configured URIs are tried in order, in up to ``retry_max`` trials.
+        Before the second trial ``retry_delay`` seconds are waited, the delay
+        gets doubled for each further trial. Raise the last
+        ``ldap.SERVER_DOWN`` if all trials fail.
+
+        Servers with open circuit are skipped, see ``health``. If
+        ``load_balancing`` is enabled, servers are tried ordered by observed
+        response time.
+        """
+        error = None
+        for trial in range(max(self._retry_max, 1)):
+            if trial:
+                time.sleep(self._retry_delay * 2 ** (trial - 1))
+            for uri in self._candidates():
+                if not server_health(uri).acquire(self._circuit_timeout):
+                    # half open circuit probed by another request
+                    continue
+                try:
+                    return self._connect(uri, bind)
+                except ldap.SERVER_DOWN, error:
+                    logger.warning(u"LDAP server at '%s' unavailable: %s" % (
+                        uri, error))
+        if error is None:
+            error = ldap.SERVER_DOWN({
+                'desc': "All LDAP servers unavailable, circuit open"})
+        raise error
+
+    def health(self):
+        """Return list of health information dicts of configured servers.
+
+        Contains ``uri``, circuit ``state`` ('closed', 'open' or
+        'half_open'), average response time ``latency`` in seconds or None
+        if not measured yet, average ``error_rate`` and number of consecutive
+        ``failures``.
+        """
+        return [server_health(uri).info(self._circuit_timeout)
+                for uri in self._uris]
+
+    def observe(self, uri, duration=None):
+        """Record response time of a request to server at ``uri``, or a
+        failure if ``duration`` is None.
+        """
+        health = server_health(uri)
+        if duration is None:
+            health.failure(self._circuit_threshold)
+        else:
+            health.success(duration)
+
+    def _candidates(self):
+        """Return URIs of servers to try in order.
+        """
+        uris = [uri for uri in self._uris
+                if server_health(uri).available(self._circuit_timeout)]
+        if self._load_balancing:
+            # stable sort, servers not measured yet are tried first
+            uris.sort(key=lambda uri: server_health(uri).latency or 0.0)
+        return uris
+
+    def _connect(self, uri, bind):
+        con = ldap.initialize(uri)
+        con.protocol_version = self.protocol
+        start = time.time()
+        try:
+            if self._start_tls:
+                # ignore in tests for now. nevertheless provide a test
+                # environment for TLS and SSL later
+                con.start_tls_s()                           #pragma NO COVERAGE
+            if bind:
+                con.simple_bind_s(self._bindDN, self._bindPW)
+        except (ldap.SERVER_DOWN, ldap.TIMEOUT):
+            self.observe(uri)
+            raise
+        if bind:
+            self.observe(uri, time.time() - start)
+        return con
 
     def bind(self):
         """Bind to Server and return the Connection Object.
         """
-        self._con = ldap.initialize(self._uri)
-        self._con.protocol_version = self.protocol
-        if self._start_tls:
-            # ignore in tests for now. nevertheless provide a test environment
-            # for TLS and SSL later
-            self._con.start_tls_s()                         #pragma NO COVERAGE
-        self._con.simple_bind_s(self._bindDN, self._bindPW)
+        self._con = self.connect()
         return self._con
 
     def unbind(self):
@@ -144,34 +326,124 @@ class LDAPCommunicator(object):
         self.baseDN = ''
         self._connector = connector
         self._con = None
+        self._pid = None
+        self._pool = None
         self._cache = None
+        cacheprovider = None
         if connector._cache:
             cachefactory = queryUtility(ICacheProviderFactory)
             if cachefactory is None:
                 cachefactory = nullcacheProviderFactory
             cacheprovider = cachefactory()
+        # null cache stores nothing, thus search results are not indexed
+        if cacheprovider is not None \
+          and not isinstance(cacheprovider, NullCache):
             self._cache = ICacheManager(cacheprovider)
-            self._cache.setTimeout(connector._cachetimeout)
+            # stale results are kept in cache until refreshed
+            self._cache.setTimeout(connector._cachetimeout
+                                   + connector._cache_stale)
             logger.debug(u"LDAP Caching activated for instance '%s'. Use '%s' "
                           "as cache provider" % (repr(self._cache),
                                                  repr(cacheprovider)))
 
+    @property
+    def bound(self):
+        """Flag whether communicator is ready to perform operations.
+        """
+        return self._con is not None or self._pool is not None
+
     def bind(self):
         """Bind to LDAP Server.
+
+        If connection pooling is enabled, connections are borrowed from the
+        shared pool per operation instead of binding a dedicated connection.
         """
+        if self._connector._pool_size:
+            self._pool = connection_pool(self._connector)
+            return
         self._con = self._connector.bind()
+        self._pid = os.getpid()
 
     def unbind(self):
         """Unbind from LDAP Server.
         """
-        self._connector.unbind()
-        self._con = None
+        # pool is shared, connections are kept for other communicators
+        self._pool = None
+        if self._con is not None and self._pid != os.getpid():
+            # inherited from parent process, see ``_connection``
+            keep_inherited(self._con)
+            self._connector._con = None
+            self._con = None
+        if self._con is not None:
+            self._connector.unbind()
+            self._con = None
+
+    @contextmanager
+    def _connection(self, dedicated=False, observe=True):
+        """Context manager providing the connection to use for one
+        operation.
+
+        dedicated
+            Flag whether operation requires a connection not shared with
+            other communicators, e.g. paged searches, where the cookie is only
+            valid on the connection it was issued. Dedicated connection gets
+            bound on demand if connection pooling is enabled.
+
+        observe
+            Flag whether to record the duration of the operation as response
+            time of the server. Disable for operations yielding to the caller.
+        """
+        if self._pool is None or dedicated:
+            if self._con is not None and self._pid != os.getpid():
+                # inherited from parent process, socket is shared with
+                # parent and must not be used or unbound
+                keep_inherited(self._con)
+                self._con = None
+            if self._con is None:
+                self._con = self._connector.bind()
+                self._pid = os.getpid()
+            try:
+                with self._observed(self._con, observe):
+                    yield self._con
+            except ldap.SERVER_DOWN:
+                # connection is dead, bind again on next operation
+                self._con = None
+                raise
+            return
+        with self._pool.connection() as con:
+            with self._observed(con, observe):
+                yield con
+
+    @contextmanager
+    def _observed(self, con, observe=True):
+        """Context manager recording response time or failure of the
+        operation on the health of the server ``con`` is connected to.
+        """
+        if not observe:
+            yield
+            return
+        uri = getattr(con, '_uri', None) or self._connector._uri
+        start = time.time()
+        try:
+            yield
+        except (ldap.SERVER_DOWN, ldap.TIMEOUT):
+            self._connector.observe(uri)
+            raise
+        except ldap.LDAPError:
+            # server responded
+            self._connector.observe(uri, time.time() - start)
+            raise
+        self._connector.observe(uri, time.time() - start)
 
     def search(self, queryFilter, scope, baseDN=None,
                force_reload=False, attrlist=None, attrsonly=0,
-               page_size=None, cookie=None):
+               page_size=None, cookie=None, sort_keys=None,
+               offset=None, count=None):
         """Search the directory.
 
+        Identical searches issued concurrently by several threads share one
+        server request and its result. This does not apply to paged searches.
+
         queryFilter
             LDAP query filter
 
@@ -196,6 +468,23 @@ class LDAPCommunicator(object):
 
         cookie
             Cookie string returned by previous search with pagination.
+
+        sort_keys
+            List of attribute names the result gets sorted by on the server
+            using the server side sorting control. Prefix attribute name with
+            '-' for reverse order. An ordering rule can be appended, e.g.
+            'cn:caseIgnoreOrderingMatch', which is required for attributes
+            without ordering rule defined in schema.
+
+        offset
+            Index of the first entry of the sorted result to return. Requires
+            ``sort_keys``.
+
+        count
+            Number of entries to return starting at ``offset``. Requires
+            ``sort_keys``. If given, the window is fetched with the virtual
+            list view control and a tuple containing the results and the
+            estimated total count of entries is returned.
         """
         if baseDN is None:
             baseDN = self.baseDN
@@ -205,45 +494,417 @@ class LDAPCommunicator(object):
         if page_size:
             if cookie is None:
                 cookie = ''
-            pagedresults = ldap.controls.libldap.SimplePagedResultsControl(
-                criticality=True, size=page_size, cookie=cookie)
-            serverctrls = [pagedresults]
+            serverctrls = [self._paged_control(page_size, cookie)]
         else:
             if cookie:
                 raise ValueError('cookie passed without page_size')
             serverctrls = []
+        if offset is not None and count is None:
+            raise ValueError(u"offset passed without count")
+        if page_size and count is not None:
+            raise ValueError(u"Pagination and virtual list view can not be "
+                             u"combined")
+        if sort_keys or count is not None:
+            serverctrls += self._sort_controls(sort_keys, offset, count)
 
         def _search(baseDN, scope, queryFilter,
                     attrlist, attrsonly, serverctrls):
             # we have to do async search to also retrieve server controls
             # in case we do pagination of results
-            msgid = self._con.search_ext(baseDN, scope, queryFilter,
-                                         attrlist, attrsonly,
-                                         serverctrls=serverctrls)
-            rtype, results, rmsgid, rctrls = self._con.result3(msgid)
-            ctype = ldap.controls.libldap.SimplePagedResultsControl.controlType
-            pctrls = [c for c in rctrls if c.controlType == ctype]
-            if pctrls:
-                return results, pctrls[0].cookie
+            with self._connection(dedicated=bool(page_size)) as con:
+                msgid = con.search_ext(baseDN, scope, queryFilter,
+                                       attrlist, attrsonly,
+                                       serverctrls=serverctrls)
+                rtype, results, rmsgid, rctrls = con.result3(msgid)
+            if count is not None:
+                vctrls = [c for c in rctrls
+                          if c.controlType == VLVResponseControl.controlType]
+                return results, vctrls and vctrls[0].content_count or 0
+            cookie = self._paged_cookie(rctrls)
+            if cookie is not None:
+                return results, cookie
             else:
                 return results
 
         args = [baseDN, scope, queryFilter, attrlist, attrsonly, serverctrls]
+        key = self._cache_key(queryFilter, scope, baseDN, attrlist,
+                              attrsonly, page_size, cookie, sort_keys,
+                              offset, count)
+        if not page_size:
+            # identical concurrent searches share one server request. paged
+            # searches are bound to their connection and never coalesced.
+            flight_key = (tuple(self._connector._uris), key)
+            _server_search = _search
+
+            def _search(*args):
+                return search_flight.do(flight_key, _server_search, *args)
+
+        if scope == BASE and self._connector._negative_timeout:
+            # inexistent entries are remembered for ``negative_timeout``
+            if force_reload:
+                del negative_cache[key]
+            else:
+                error = negative_cache.get(key)
+                if error is not None:
+                    cache_stats.hit(scope, baseDN)
+                    raise ldap.NO_SUCH_OBJECT(dict(error))
+            _checked_search = _search
+
+            def _search(*args):
+                try:
+                    return _checked_search(*args)
+                except ldap.NO_SUCH_OBJECT, e:
+                    self._missing(key, baseDN, e)
+                    raise
+
         if self._cache:
-            key = '%s-%s-%s-%s-%s-%i-%s-%s' % (self._connector._bindDN,
-                                   baseDN,
-                                   sorted(attrlist or []),
-                                   attrsonly,
-                                   queryFilter,
-                                   scope,
-                                   page_size,
-                                   cookie)
-            key = md5digest(key)
-            return self._cache.getData(_search, key,
-                                       force_reload, args)
+            def _cached_search(*args):
+                res = _search(*args)
+                self._tag(key, scope, baseDN, res)
+                self._fresh(key)
+                return res
+            if self._serves_stale and not page_size and not force_reload:
+                res = self._cache.get(key)
+                if res is not None:
+                    cache_stats.hit(scope, baseDN)
+                    if cache_refresher.stale(key):
+                        cache_refresher.refresh(key, self._refresh, key,
+                                                _cached_search, args)
+                    return res
+            missed = list()
+
+            def _missed_search(*args):
+                start = time.time()
+                res = _cached_search(*args)
+                missed.append(time.time() - start)
+                return res
+            res = self._cache.getData(_missed_search, key, force_reload, args)
+            if missed:
+                cache_stats.miss(scope, baseDN, missed[0])
+            else:
+                cache_stats.hit(scope, baseDN)
+            return res
         else:
             return _search(*args)
 
+    def cache_stats(self):
+        """Return statistics of cached searches as dict.
+
+        Contains hits, misses and saved response time of all communicators
+        of this process, see ``node.ext.ldap.cache.CacheStats.info``, and
+        ``entries``, ``bytes`` and ``evictions`` of the cache provider if
+        supported, otherwise None.
+        """
+        info = cache_stats.info()
+        provider = getattr(self._cache, 'cache', None)
+        try:
+            info['entries'] = len(provider.keys())
+        except Exception:
+            # memcached does not support listing keys
+            info['entries'] = None
+        try:
+            info['bytes'] = provider.size()
+        except Exception:
+            info['bytes'] = None
+        info['evictions'] = getattr(provider, 'evictions', None)
+        return info
+
+    def search_entries(self, dns, attrlist=None, force_reload=False,
+                       chunk_size=100):
+        """Fetch the entries at ``dns``.
+
+        Return list of ``(dn, attrs)`` tuples in order of ``dns``. Inexistent
+        entries are omitted.
+
+        If caching is enabled, the entries are cached like the results of
+        BASE searches. Cached entries are looked up in one cache operation,
+        entries not cached are fetched with one ONELEVEL search per parent DN,
+        combining up to ``chunk_size`` entries in one filter.
+        """
+        queryFilter = '(objectClass=*)'
+        keys = [self._cache_key(queryFilter, BASE, dn, attrlist, 0)
+                for dn in dns]
+        found = dict()
+        if self._cache and not force_reload:
+            found = self._cache_get_multi(keys)
+            for dn, key in zip(dns, keys):
+                if key in found:
+                    cache_stats.hit(BASE, dn)
+        missing = [dn for dn, key in zip(dns, keys) if key not in found]
+        if missing:
+            start = time.time()
+            fetched = self._fetch_entries(missing, attrlist, chunk_size)
+            if self._cache:
+                duration = (time.time() - start) / len(missing)
+                for dn in missing:
+                    cache_stats.miss(BASE, dn, duration)
+            loaded = dict()
+            for dn, key in zip(dns, keys):
+                if key in found:
+                    continue
+                entry = fetched.get(normalize_dn(dn))
+                if entry is not None:
+                    loaded[key] = found[key] = [entry]
+            if self._cache and loaded:
+                self._cache_set_multi(loaded)
+                for dn, key in zip(dns, keys):
+                    if key in loaded:
+                        self._tag(key, BASE, dn, loaded[key])
+                        self._fresh(key)
+        return [found[key][0] for key in keys if found.get(key)]
+
+    def _fetch_entries(self, dns, attrlist, chunk_size):
+        """Return dict containing the entries at ``dns`` found by normalized
+        DN.
+        """
+        filters = dict()
+        for dn in dns:
+            try:
+                rdns = ldap.dn.str2dn(dn)
+            except ldap.DECODING_ERROR:
+                continue
+            if not rdns:
+                continue
+            rdn = ''.join(['(%s=%s)' % (name, escape_filter_chars(value))
+                           for name, value, flags in rdns[0]])
+            if len(rdns[0]) > 1:
+                rdn = '(&%s)' % rdn
+            parent = ldap.dn.dn2str(rdns[1:])
+            filters.setdefault(parent, list()).append(rdn)
+        fetched = dict()
+        for parent, rdns in filters.items():
+            for i in range(0, len(rdns), chunk_size):
+                queryFilter = '(|%s)' % ''.join(rdns[i:i + chunk_size])
+                try:
+                    with self._connection() as con:
+                        msgid = con.search_ext(parent, ONELEVEL, queryFilter,
+                                               attrlist)
+                        results = con.result3(msgid)[1]
+                except ldap.NO_SUCH_OBJECT:
+                    break
+                for dn, attrs in results:
+                    # ActiveDirectory returns entries with dn None
+                    if dn is not None:
+                        fetched[normalize_dn(dn)] = (dn, attrs)
+        return fetched
+
+    def _cache_get_multi(self, keys):
+        cache = self._cache
+        if not hasattr(cache, 'get_multi'):
+            # managers of ``bda.cache`` do not support multiple keys, use
+            # cache provider directly
+            cache = getattr(cache, 'cache', cache)
+        return get_multi(cache, keys)
+
+    def _cache_set_multi(self, mapping):
+        cache = self._cache
+        if not hasattr(cache, 'set_multi'):
+            cache = getattr(cache, 'cache', cache)
+        set_multi(cache, mapping)
+
+    @property
+    def _serves_stale(self):
+        connector = self._connector
+        return bool(connector._cache_stale and connector._cachetimeout)
+
+    def _fresh(self, key):
+        """Consider cached result of ``key`` fresh for the cache timeout,
+        randomly shortened by ``cache_jitter``, if stale results are served.
+        """
+        if not self._serves_stale:
+            return
+        connector = self._connector
+        jitter = connector._cache_jitter * random.random()
+        cache_refresher.fresh(key, connector._cachetimeout * (1.0 - jitter))
+
+    def _refresh(self, key, function, args):
+        """Refresh cached result of ``key``. Called in background.
+        """
+        if not self.bound:
+            # never bind from background
+            return
+        self._cache.set(key, function(*args))
+
+    def _cache_key(self, queryFilter, scope, baseDN, attrlist, attrsonly,
+                   page_size=None, cookie=None, sort_keys=None, offset=None,
+                   count=None):
+        # equivalent filters and attribute lists share the cache key
+        key = '%s-%s-%s-%s-%s-%i-%s-%s-%s-%s-%s' % (
+                               self._connector._bindDN,
+                               baseDN,
+                               sorted(set(attrlist or [])),
+                               attrsonly,
+                               normalize_filter(queryFilter),
+                               scope,
+                               page_size,
+                               cookie,
+                               sort_keys,
+                               offset,
+                               count)
+        return md5digest(key)
+
+    def cache_entry(self, dn, attrs, attrlist=['*'],
+                    queryFilter='(objectClass=*)'):
+        """Store ``attrs`` as cached result of the BASE search for ``dn``.
+
+        Called after writing an entry with known attributes, so reading the
+        entry again does not require a server round trip. ``attrs`` must
+        contain all values of the attributes requested by ``attrlist``.
+        """
+        if not self._cache:
+            return
+        key = self._cache_key(queryFilter, BASE, dn, attrlist, 0)
+        res = [(dn, attrs)]
+        self._cache.set(key, res)
+        self._tag(key, BASE, dn, res)
+        self._fresh(key)
+
+    def _tag(self, key, scope, baseDN, res):
+        """Index cached search result for invalidation on writes.
+        """
+        results = res[0] if isinstance(res, tuple) else res
+        for dropped in cache_index.add(key,
+                                       search_tags(scope, baseDN, results)):
+            self._forget(dropped)
+
+    def _missing(self, key, baseDN, error):
+        """Remember BASE search of ``key`` failed with ``error`` since entry
+        at ``baseDN`` does not exist.
+        """
+        info = error.args and error.args[0] or dict()
+        timeout = self._connector._negative_timeout
+        negative_cache.set(key, dict(info), timeout)
+        for dropped in cache_index.add(key, search_tags(BASE, baseDN, [])):
+            self._forget(dropped)
+
+    def _forget(self, key):
+        """Remove cached result of ``key``. Cached results are removed from
+        the registered cache provider, regardless of whether this
+        communicator caches, thus writes invalidate for all communicators.
+        """
+        del negative_cache[key]
+        cache = registered_cache()
+        if cache is not None:
+            cache.rem(key)
+
+    def invalidate(self, dn):
+        """Remove cached search results affected by a write of the entry at
+        ``dn``. Called by write operations.
+        """
+        for key in cache_index.pop(write_tags(dn)):
+            self._forget(key)
+
+    def iter_search(self, queryFilter, scope, baseDN=None, attrlist=None,
+                    attrsonly=0, page_size=None, prefetch=False):
+        """Search the directory and yield ``(dn, attrs)`` tuples as entries
+        arrive from the server.
+
+        Results are neither collected nor cached, thus memory usage does not
+        depend on the size of the result set. ``queryFilter``, ``scope``,
+        ``baseDN``, ``attrlist`` and ``attrsonly`` are the same as in
+        ``search``.
+
+        page_size
+            If given, walk through all pages of a paged search with
+            ``page_size`` entries per page.
+
+        prefetch
+            Flag whether to request the next page before yielding the entries
+            of current page. Only takes effect if ``page_size`` is given. Holds
+            one page in memory.
+        """
+        if baseDN is None:
+            baseDN = self.baseDN
+            if not baseDN:
+                raise ValueError(u"baseDN unset.")
+        args = (baseDN, scope, queryFilter, attrlist, attrsonly)
+        with self._connection(observe=False) as con:
+            if not page_size:
+                msgid = con.search_ext(*args)
+                for entry in self._iter_result(con, msgid):
+                    yield entry
+                return
+            serverctrls = [self._paged_control(page_size, '')]
+            msgid = con.search_ext(*args, serverctrls=serverctrls)
+            try:
+                while msgid is not None:
+                    rctrls = list()
+                    if prefetch:
+                        page = list(self._iter_result(con, msgid, rctrls))
+                    else:
+                        page = self._iter_result(con, msgid, rctrls)
+                        for entry in page:
+                            yield entry
+                    msgid = None
+                    cookie = self._paged_cookie(rctrls)
+                    if cookie:
+                        serverctrls = [self._paged_control(page_size, cookie)]
+                        msgid = con.search_ext(*args, serverctrls=serverctrls)
+                    if prefetch:
+                        for entry in page:
+                            yield entry
+            finally:
+                if msgid is not None and prefetch:
+                    con.abandon(msgid)
+
+    def _sort_controls(self, sort_keys, offset, count):
+        """Return server side sorting and virtual list view controls.
+        """
+        if not sort_keys:
+            raise ValueError(u"Virtual list view requires sort_keys")
+        if SSSRequestControl is None:
+            raise RuntimeError(                             #pragma NO COVERAGE
+                u"Server side sorting control unavailable, "#pragma NO COVERAGE
+                u"requires python-ldap >= 2.4.22")          #pragma NO COVERAGE
+        ctrls = [SSSRequestControl(criticality=True,
+                                   ordering_rules=list(sort_keys))]
+        if count is not None:
+            if VLVRequestControl is None:
+                raise RuntimeError(                         #pragma NO COVERAGE
+                    u"Virtual list view control "           #pragma NO COVERAGE
+                    u"unavailable, requires python-ldap "   #pragma NO COVERAGE
+                    u">= 2.4.22")                           #pragma NO COVERAGE
+            ctrls.append(VLVRequestControl(criticality=True,
+                                           before_count=0,
+                                           after_count=max(count - 1, 0),
+                                           offset=(offset or 0) + 1,
+                                           content_count=0))
+        return ctrls
+
+    def _paged_control(self, page_size, cookie):
+        return ldap.controls.libldap.SimplePagedResultsControl(
+            criticality=True, size=page_size, cookie=cookie)
+
+    def _paged_cookie(self, rctrls):
+        """Return paged results cookie from response controls or None.
+        """
+        ctype = ldap.controls.libldap.SimplePagedResultsControl.controlType
+        pctrls = [c for c in rctrls if c.controlType == ctype]
+        if pctrls:
+            return pctrls[0].cookie
+
+    def _iter_result(self, con, msgid, rctrls=None):
+        """Yield entries of search with ``msgid`` one by one.
+
+        If ``rctrls`` list is given, server controls of the final search
+        result are appended. Search gets abandoned if iteration is
+        stopped before all entries have been received.
+        """
+        done = False
+        try:
+            while True:
+                rtype, rdata, rmsgid, ctrls = con.result3(msgid, all=0)
+                if rtype == ldap.RES_SEARCH_RESULT:
+                    done = True
+                    if rctrls is not None:
+                        rctrls.extend(ctrls)
+                    return
+                for entry in rdata:
+                    yield entry
+        finally:
+            if not done:
+                con.abandon(msgid)
+
     def add(self, dn, data):
         """Insert an entry into directory.
 
@@ -254,7 +915,9 @@ class LDAPCommunicator(object):
             dict containing key/value pairs of entry attributes
         """
         attributes = [(k, v) for k, v in data.items()]
-        self._con.add_s(dn, attributes)
+        with self._connection() as con:
+            con.add_s(dn, attributes)
+        self.invalidate(dn)
 
     def modify(self, dn, modlist):
         """Modify an existing entry in the directory.
@@ -265,17 +928,113 @@ class LDAPCommunicator(object):
         gives the name of the field to modify, and the third gives the new
         value for the field (for MOD_ADD and MOD_REPLACE).
         """
-        self._con.modify_s(dn, modlist)
+        with self._connection() as con:
+            con.modify_s(dn, modlist)
+        self.invalidate(dn)
 
     def delete(self, deleteDN):
         """Delete an entry from the directory.
 
         Take the DN to delete from the directory as argument.
         """
-        self._con.delete_s(deleteDN)
+        with self._connection() as con:
+            con.delete_s(deleteDN)
+        self.invalidate(deleteDN)
+
+    def batch(self, operations, window=None):
+        """Execute write operations pipelined on one connection.
+
+        All requests are sent without waiting for the response of preceding
+        ones and results are collected by message id afterwards, thus the
+        whole batch costs roughly one round trip.
+
+        operations
+            Iterable of operation tuples, one of ``('add', dn, data)``,
+            ``('modify', dn, modlist)`` or ``('delete', dn)``. Arguments
+            are the same as for ``add``, ``modify`` and ``delete``.
+
+        window
+            Maximum number of outstanding requests. If None, all requests are
+            sent before collecting the first result.
+
+        Operations are sent in given order, but the server may process
+        them concurrently. Dependent operations, like adding an entry and
+        its children, must not be contained in the same batch.
+
+        Return list of ``(dn, error)`` tuples in order of operations, where
+        error is None if operation succeeded, or the ``ldap.LDAPError``
+        instance raised for the operation. ``ldap.SERVER_DOWN`` is not
+        collected but raised.
+        """
+        results = list()
+        pending = list()
+        with self._connection() as con:
+            def collect():
+                index, msgid = pending.pop(0)
+                try:
+                    con.result3(msgid)
+                except ldap.SERVER_DOWN:
+                    raise
+                except ldap.LDAPError, e:
+                    results[index] = (results[index][0], e)
+            try:
+                for operation in operations:
+                    name, dn = operation[:2]
+                    if name == 'add':
+                        attributes = [(k, v) for k, v in operation[2].items()]
+                        msgid = con.add_ext(dn, attributes)
+                    elif name == 'modify':
+                        msgid = con.modify_ext(dn, operation[2])
+                    elif name == 'delete':
+                        msgid = con.delete_ext(dn)
+                    else:
+                        raise ValueError(u"Unknown operation '%s'" % name)
+                    pending.append((len(results), msgid))
+                    results.append((dn, None))
+                    if window and len(pending) >= window:
+                        collect()
+                while pending:
+                    collect()
+            finally:
+                # do not leave responses of outstanding requests on a
+                # connection which gets reused
+                for index, msgid in pending:
+                    try:
+                        con.abandon(msgid)
+                    except ldap.LDAPError:
+                        pass
+                for dn, error in results:
+                    self.invalidate(dn)
+        return results
 
     def passwd(self, userdn, oldpw, newpw):
-        self._con.passwd_s(userdn, oldpw, newpw)
+        with self._connection() as con:
+            con.passwd_s(userdn, oldpw, newpw)
+        self.invalidate(userdn)
+
+    def authenticate(self, dn, pw):
+        """Verify credentials by binding a separate connection.
+
+        If ``auth_pool_size`` is configured, connections are borrowed from
+        the shared authentication pool and re-bound per check, otherwise a
+        new connection is created and closed after the check.
+        """
+        if self._connector._auth_pool_size:
+            pool = authentication_pool(self._connector)
+            with pool.connection() as con:
+                return self._simple_bind(con, dn, pw)
+        con = self._connector.connect(bind=False)
+        try:
+            return self._simple_bind(con, dn, pw)
+        finally:
+            con.unbind_s()
+
+    def _simple_bind(self, con, dn, pw):
+        try:
+            con.simple_bind_s(dn, pw)
+        except ldap.INVALID_CREDENTIALS:
+            return False
+        return True
 
 
 def main():
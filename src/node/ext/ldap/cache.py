@@ -1,10 +1,38 @@
 # -*- coding: utf-8 -*-
+import Queue
+import ldap.dn
+import logging
+import os
+import re
+import struct
+import sys
+import threading
+import time
+import zlib
+from array import array
+from collections import OrderedDict
+from zope.component import (
+    adapter,
+    provideAdapter,
+)
 from zope.interface import implementer
 from bda.cache import (
+    ICacheManager,
     Memcached,
     NullCache,
 )
-from .interfaces import ICacheProviderFactory
+from .interfaces import (
+    ICacheProviderFactory,
+    ILocalCacheProvider,
+)
+from .scope import (
+    BASE,
+    ONELEVEL,
+    SUBTREE,
+)
+
+
+logger = logging.getLogger('node.ext.ldap')
 
 
 def nullcacheProviderFactory():
@@ -20,8 +48,1075 @@ class MemcachedProviderFactory(object):
     """Memcached cache provider factory.
     """
 
-    def __init__(self, servers=['127.0.0.1:11211']):
+    def __init__(self, servers=['127.0.0.1:11211'], compact=False,
+                 compress_threshold=4096):
+        """
+        servers
+            List of memcached servers.
+
+        compact
+            Flag whether to store search results encoded by
+            ``encode_results`` instead of pickled.
+
+        compress_threshold
+            Size in bytes above which encoded search results get compressed.
+        """
         self.servers = servers
+        self.compact = compact
+        self.compress_threshold = compress_threshold
 
     def __call__(self):
-        return Memcached(self.servers)
+        cache = Memcached(self.servers)
+        if self.compact:
+            cache = CompactCache(cache, self.compress_threshold)
+        return cache
+
+
+def sizeof(value):
+    """Estimate memory used by cached ``value`` in bytes.
+
+    Counts the length of contained strings plus a fixed overhead per object,
+    which is sufficient for LDAP search results.
+    """
+    if isinstance(value, basestring):
+        return len(value) + 40
+    if isinstance(value, dict):
+        return 280 + sum([sizeof(k) + sizeof(v) for k, v in value.items()])
+    if isinstance(value, (list, tuple)):
+        return 64 + sum([sizeof(item) for item in value])
+    return 24
+
+
+@implementer(ILocalCacheProvider)
+class LocalCache(object):
+    """Thread safe in-process cache.
+
+    Size is bounded by number of entries and estimated bytes, least recently
+    used entries are evicted first. Values larger than ``max_bytes`` are not
+    cached at all. Entries expire after ``timeout`` seconds.
+    """
+
+    def __init__(self, max_entries=1000, max_bytes=None):
+        """
+        max_entries
+            Maximum number of cached entries. If None, unbounded.
+
+        max_bytes
+            Maximum estimated size of cached values in bytes. If None,
+            unbounded.
+        """
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.timeout = 0
+        self.evictions = 0
+        self._data = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.RLock()
+
+    def reset(self):
+        with self._lock:
+            self._data.clear()
+            self._bytes = 0
+
+    def size(self):
+        return self._bytes
+
+    def keys(self):
+        with self._lock:
+            self._expire()
+            return self._data.keys()
+
+    def values(self):
+        with self._lock:
+            self._expire()
+            return [entry[0] for entry in self._data.values()]
+
+    def get(self, key, default=None):
+        with self._lock:
+            return self._get(key, default, time.time())
+
+    def _get(self, key, default, now):
+        entry = self._data.pop(key, None)
+        if entry is None:
+            return default
+        value, expires, size = entry
+        if expires is not None and expires <= now:
+            self._bytes -= size
+            return default
+        # mark most recently used
+        self._data[key] = entry
+        return value
+
+    def get_multi(self, keys):
+        """Return dict containing the cached values of ``keys`` found.
+        """
+        found = dict()
+        with self._lock:
+            now = time.time()
+            for key in keys:
+                value = self._get(key, None, now)
+                if value is not None:
+                    found[key] = value
+        return found
+
+    def __getitem__(self, key):
+        return self.get(key)
+
+    def set(self, key, value, timeout=None):
+        self.set_multi({key: value}, timeout)
+
+    def set_multi(self, mapping, timeout=None):
+        """Store items of ``mapping``, see ``set``.
+        """
+        if timeout is None:
+            timeout = self.timeout
+        expires = timeout and time.time() + timeout or None
+        sizes = [(key, value, sizeof(value)) for key, value in mapping.items()]
+        with self._lock:
+            for key, value, size in sizes:
+                self._remove(key)
+                if self.max_bytes is not None and size > self.max_bytes:
+                    # would evict everything else and still not fit
+                    continue
+                self._data[key] = (value, expires, size)
+                self._bytes += size
+            self._evict()
+
+    def __setitem__(self, key, value):
+        self.set(key, value)
+
+    def __delitem__(self, key):
+        with self._lock:
+            self._remove(key)
+
+    def _remove(self, key):
+        entry = self._data.pop(key, None)
+        if entry is not None:
+            self._bytes -= entry[2]
+
+    def _exceeded(self):
+        if self.max_entries is not None \
+          and len(self._data) > self.max_entries:
+            return True
+        return self.max_bytes is not None and self._bytes > self.max_bytes
+
+    def _evict(self):
+        while self._data and self._exceeded():
+            key, entry = self._data.popitem(last=False)
+            self._bytes -= entry[2]
+            self.evictions += 1
+
+    def _expire(self):
+        now = time.time()
+        for key, entry in self._data.items():
+            if entry[1] is not None and entry[1] <= now:
+                self._remove(key)
+
+
+@implementer(ICacheManager)
+@adapter(ILocalCacheProvider)
+class LocalCacheManager(object):
+    """Cache manager for ``LocalCache``. Timeout is kept per manager, thus
+    managers with different timeouts can share one cache.
+    """
+
+    def __init__(self, context):
+        self.cache = context
+        self.timeout = None
+
+    def setTimeout(self, timeout):
+        self.timeout = timeout
+
+    def getData(self, func, key, force_reload=False, args=[], kwargs={}):
+        ret = self.get(key, force_reload)
+        if ret is None:
+            ret = func(*args, **kwargs)
+            self.set(key, ret)
+        return ret
+
+    def get(self, key, force_reload=False):
+        if force_reload:
+            del self.cache[key]
+            return None
+        return self.cache.get(key, None)
+
+    def get_multi(self, keys):
+        return self.cache.get_multi(keys)
+
+    def set(self, key, item):
+        self.cache.set(key, item, self.timeout)
+
+    def set_multi(self, mapping):
+        self.cache.set_multi(mapping, self.timeout)
+
+    def rem(self, key):
+        del self.cache[key]
+
+    def __delitem__(self, key):
+        del self.cache[key]
+
+
+provideAdapter(LocalCacheManager)
+
+
+@implementer(ICacheProviderFactory)
+class LocalCacheProviderFactory(object):
+    """In-process cache provider factory.
+
+    All communicators share the one ``LocalCache`` instance created by this
+    factory.
+    """
+
+    def __init__(self, max_entries=1000, max_bytes=None):
+        self.cache = LocalCache(max_entries=max_entries, max_bytes=max_bytes)
+
+    def __call__(self):
+        return self.cache
+
+
+MAGIC = 'NLR'
+VERSION = 1
+COMPRESSED = 0x1
+
+# result kinds
+_LIST = 0
+_PAGED = 1
+_COUNTED = 2
+
+# attribute value layouts
+_SEPARATED = 0
+_PREFIXED = 1
+
+# unsigned 32 bit integer type code
+_UINT = array('I').itemsize == 4 and 'I' or 'L'
+
+
+def _shared_suffix(a, b):
+    """length of common suffix of strings ``a`` and ``b``.
+    """
+    length = min(len(a), len(b))
+    i = 0
+    while i < length and a[-1 - i] == b[-1 - i]:
+        i += 1
+    return i
+
+
+def encode_results(value, compress_threshold=None):
+    """Encode search result ``value`` as compact binary string.
+
+    ``value`` is a list of ``(dn, attrs)`` tuples as returned by searches,
+    or a tuple containing such a list and a paged results cookie or the
+    estimated count of entries. Strings are stored as one blob, lengths and
+    counts as array of integers. DNs are stored without the suffix shared
+    with the DN of the previous entry. Attribute values are stored separated
+    by null bytes, which allows splitting them at once when decoding, or
+    length prefixed if values contain null bytes. If the encoded result
+    exceeds ``compress_threshold`` bytes, it gets compressed with zlib.
+
+    Return None if ``value`` is no search result.
+    """
+    kind = _LIST
+    extra = 0
+    blob = list()
+    if isinstance(value, tuple):
+        if len(value) != 2:
+            return None
+        value, info = value
+        if isinstance(info, str):
+            kind = _PAGED
+            extra = len(info)
+            blob.append(info)
+        elif isinstance(info, (int, long)) and 0 <= info < 2 ** 32:
+            kind = _COUNTED
+            extra = info
+        else:
+            return None
+    if not isinstance(value, list):
+        return None
+    ints = [kind, extra, len(value)]
+    previous = ''
+    for entry in value:
+        if not isinstance(entry, tuple) or len(entry) != 2:
+            return None
+        dn, attrs = entry
+        # referrals returned by ActiveDirectory have no dn and attrs dict
+        if not isinstance(dn, str) or not isinstance(attrs, dict):
+            return None
+        shared = _shared_suffix(dn, previous)
+        prefix = dn[:len(dn) - shared]
+        ints += [shared, len(prefix), len(attrs)]
+        blob.append(prefix)
+        previous = dn
+        for name, values in attrs.iteritems():
+            if not isinstance(name, str) or not isinstance(values, list):
+                return None
+            for item in values:
+                if not isinstance(item, str):
+                    return None
+            ints += [len(name), len(values)]
+            blob.append(name)
+            joined = '\0'.join(values)
+            if joined.count('\0') == len(values) - 1:
+                ints += [_SEPARATED, len(joined)]
+                blob.append(joined)
+            else:
+                ints.append(_PREFIXED)
+                ints += [len(item) for item in values]
+                blob += values
+    blob = ''.join(blob)
+    ints = array(_UINT, ints)
+    if sys.byteorder != 'little':
+        ints.byteswap()
+    body = struct.pack('<I', len(ints)) + ints.tostring() + blob
+    flags = 0
+    if compress_threshold is not None and len(body) > compress_threshold:
+        body = zlib.compress(body, 1)
+        flags |= COMPRESSED
+    return '%s%s%s%s' % (MAGIC, chr(VERSION), chr(flags), body)
+
+
+def decode_results(data):
+    """Decode search result encoded by ``encode_results``.
+
+    Values not encoded by ``encode_results`` are returned unchanged.
+    """
+    if not isinstance(data, str) or data[:3] != MAGIC:
+        return data
+    if ord(data[3]) != VERSION:
+        raise ValueError(u"Unknown version of encoded search result")
+    body = data[5:]
+    if ord(data[4]) & COMPRESSED:
+        body = zlib.decompress(body)
+    length = struct.unpack('<I', body[:4])[0]
+    pos = 4 + length * 4
+    ints = array(_UINT)
+    ints.fromstring(body[4:pos])
+    if sys.byteorder != 'little':
+        ints.byteswap()
+    ints = ints.tolist()
+    kind, extra, count = ints[:3]
+    i = 3
+    if kind == _PAGED:
+        info = body[pos:pos + extra]
+        pos += extra
+    else:
+        info = extra
+    results = list()
+    previous = ''
+    for _ in xrange(count):
+        shared, prefix_length, attr_count = ints[i:i + 3]
+        i += 3
+        dn = body[pos:pos + prefix_length]
+        pos += prefix_length
+        if shared:
+            dn += previous[len(previous) - shared:]
+        previous = dn
+        attrs = dict()
+        for _ in xrange(attr_count):
+            name_length, value_count, layout = ints[i:i + 3]
+            i += 3
+            name = body[pos:pos + name_length]
+            pos += name_length
+            if layout == _SEPARATED:
+                length = ints[i]
+                i += 1
+                if value_count:
+                    values = body[pos:pos + length].split('\0')
+                else:
+                    values = list()
+                pos += length
+            else:
+                values = list()
+                for length in ints[i:i + value_count]:
+                    values.append(body[pos:pos + length])
+                    pos += length
+                i += value_count
+            attrs[name] = values
+        results.append((dn, attrs))
+    if kind == _LIST:
+        return results
+    return results, info
+
+
+def get_multi(cache, keys):
+    """Return dict containing the values of ``keys`` found in ``cache``
+    provider or manager, fetched in one operation if supported.
+    """
+    if hasattr(cache, 'get_multi'):
+        return cache.get_multi(keys)
+    if isinstance(cache, Memcached):
+        # bda.cache does not expose ``get_multi`` of the memcached client
+        return cache._client.get_multi(keys)
+    found = dict()
+    for key in keys:
+        value = cache.get(key)
+        if value is not None:
+            found[key] = value
+    return found
+
+
+def set_multi(cache, mapping):
+    """Store items of ``mapping`` in ``cache`` provider or manager, in one
+    operation if supported.
+    """
+    if hasattr(cache, 'set_multi'):
+        cache.set_multi(mapping)
+        return
+    if isinstance(cache, Memcached):
+        cache._client.set_multi(mapping, time=cache.timeout)
+        return
+    for key, value in mapping.items():
+        cache.set(key, value)
+
+
+def _set_with_timeout(cache, lock, mapping, timeout):
+    """store items of ``mapping`` in ``cache`` provider taking the timeout
+    from its ``timeout`` attribute, e.g. ``bda.cache.Memcached``.
+    """
+    with lock:
+        previous = cache.timeout
+        cache.timeout = timeout
+        try:
+            set_multi(cache, mapping)
+        finally:
+            cache.timeout = previous
+
+
+@implementer(ILocalCacheProvider)
+class CompactCache(object):
+    """Cache provider wrapper storing search results encoded by
+    ``encode_results``, which is smaller and faster than pickling them.
+
+    Other values are stored unchanged.
+    """
+
+    evictions = 0
+
+    def __init__(self, cache, compress_threshold=4096):
+        """
+        cache
+            Wrapped cache provider, e.g. ``bda.cache.Memcached``.
+
+        compress_threshold
+            Size in bytes above which encoded search results get compressed.
+            If None, never compress.
+        """
+        self.cache = cache
+        self.compress_threshold = compress_threshold
+        self._lock = threading.Lock()
+
+    def _get_timeout(self):
+        return self.cache.timeout
+
+    def _set_timeout(self, timeout):
+        self.cache.timeout = timeout
+
+    timeout = property(_get_timeout, _set_timeout)
+
+    def reset(self):
+        self.cache.reset()
+
+    def size(self):
+        return self.cache.size()
+
+    def keys(self):
+        return self.cache.keys()
+
+    def values(self):
+        return [decode_results(value) for value in self.cache.values()]
+
+    def get(self, key, default=None):
+        value = self.cache.get(key, None)
+        if value is None:
+            return default
+        return decode_results(value)
+
+    def get_multi(self, keys):
+        found = get_multi(self.cache, keys)
+        return dict([(key, decode_results(value))
+                     for key, value in found.items()])
+
+    def __getitem__(self, key):
+        return self.get(key)
+
+    def _encode(self, value):
+        data = encode_results(value, self.compress_threshold)
+        if data is None:
+            return value
+        return data
+
+    def set(self, key, value, timeout=None):
+        self.set_multi({key: value}, timeout)
+
+    def set_multi(self, mapping, timeout=None):
+        if timeout is None:
+            timeout = self.timeout
+        mapping = dict([(key, self._encode(value))
+                        for key, value in mapping.items()])
+        _set_with_timeout(self.cache, self._lock, mapping, timeout)
+
+    def __setitem__(self, key, value):
+        self.cache[key] = self._encode(value)
+
+    def __delitem__(self, key):
+        del self.cache[key]
+
+
+@implementer(ILocalCacheProvider)
+class TieredCache(object):
+    """Two tier cache with an in-process ``LocalCache`` in front of a shared
+    cache provider, e.g. ``Memcached``.
+
+    Entries found in the shared tier are promoted to the local tier, thus
+    frequently used entries are served without network round trip. Local
+    entries expire after ``local_timeout`` seconds, which bounds the time
+    changes made by other processes remain unnoticed.
+    """
+
+    def __init__(self, shared, local=None, local_timeout=60):
+        """
+        shared
+            Shared cache provider, e.g. ``bda.cache.Memcached``.
+
+        local
+            ``LocalCache`` used as local tier. Defaults to ``LocalCache``
+            with 1000 entries.
+
+        local_timeout
+            Maximum time to live of entries in local tier in seconds.
+        """
+        self.shared = shared
+        if local is None:
+            local = LocalCache()
+        self.local = local
+        self.local_timeout = local_timeout
+        self._lock = threading.Lock()
+
+    def _get_timeout(self):
+        return self.shared.timeout
+
+    def _set_timeout(self, timeout):
+        self.shared.timeout = timeout
+
+    timeout = property(_get_timeout, _set_timeout)
+
+    @property
+    def evictions(self):
+        return self.local.evictions
+
+    def reset(self):
+        self.local.reset()
+        self.shared.reset()
+
+    def size(self):
+        return self.local.size()
+
+    def keys(self):
+        return self.local.keys()
+
+    def values(self):
+        return self.local.values()
+
+    def get(self, key, default=None):
+        value = self.local.get(key)
+        if value is not None:
+            return value
+        value = self.shared.get(key, None)
+        if value is None:
+            return default
+        # promote
+        self.local.set(key, value, self._local_timeout(self.timeout))
+        return value
+
+    def get_multi(self, keys):
+        found = self.local.get_multi(keys)
+        missing = [key for key in keys if key not in found]
+        if missing:
+            promoted = get_multi(self.shared, missing)
+            self.local.set_multi(promoted, self._local_timeout(self.timeout))
+            found.update(promoted)
+        return found
+
+    def __getitem__(self, key):
+        return self.get(key)
+
+    def set(self, key, value, timeout=None):
+        self.set_multi({key: value}, timeout)
+
+    def set_multi(self, mapping, timeout=None):
+        if timeout is None:
+            timeout = self.timeout
+        _set_with_timeout(self.shared, self._lock, mapping, timeout)
+        self.local.set_multi(mapping, self._local_timeout(timeout))
+
+    def __setitem__(self, key, value):
+        self.set(key, value)
+
+    def __delitem__(self, key):
+        del self.local[key]
+        del self.shared[key]
+
+    def _local_timeout(self, timeout):
+        if not timeout:
+            return self.local_timeout
+        return min(timeout, self.local_timeout)
+
+
+@implementer(ICacheProviderFactory)
+class TieredCacheProviderFactory(object):
+    """Cache provider factory for a ``LocalCache`` in front of Memcached.
+
+    All communicators share the one ``TieredCache`` instance created by this
+    factory.
+    """
+
+    def __init__(self, servers=['127.0.0.1:11211'], max_entries=1000,
+                 max_bytes=None, local_timeout=60, compress_threshold=4096):
+        self.servers = servers
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.local_timeout = local_timeout
+        self.compress_threshold = compress_threshold
+        self.cache = None
+
+    def __call__(self):
+        if self.cache is None:
+            local = LocalCache(max_entries=self.max_entries,
+                               max_bytes=self.max_bytes)
+            shared = CompactCache(Memcached(self.servers),
+                                  self.compress_threshold)
+            self.cache = TieredCache(shared, local=local,
+                                     local_timeout=self.local_timeout)
+        return self.cache
+
+
+class CacheStats(object):
+    """Thread safe statistics of cached searches.
+
+    Counts cache hits and misses and the response time of the server on
+    misses, in total and per search scope and base DN. The time saved by
+    hits is estimated by the average response time on misses of the same
+    scope and base DN.
+    """
+
+    def __init__(self, max_searches=1000):
+        """
+        max_searches
+            Maximum number of scope and base DN combinations tracked
+            separately. Further searches are accounted per scope with base
+            DN None.
+        """
+        self.max_searches = max_searches
+        self._searches = dict()
+        self._lock = threading.Lock()
+
+    def _counters(self, scope, baseDN):
+        key = (scope, baseDN and baseDN.lower())
+        counters = self._searches.get(key)
+        if counters is None:
+            if len(self._searches) >= self.max_searches:
+                key = (scope, None)
+                counters = self._searches.get(key)
+            if counters is None:
+                # hits, misses, response time of misses
+                counters = self._searches[key] = [0, 0, 0.0]
+        return counters
+
+    def hit(self, scope, baseDN):
+        with self._lock:
+            self._counters(scope, baseDN)[0] += 1
+
+    def miss(self, scope, baseDN, duration):
+        with self._lock:
+            counters = self._counters(scope, baseDN)
+            counters[1] += 1
+            counters[2] += duration
+
+    def reset(self):
+        with self._lock:
+            self._searches.clear()
+
+    def _info(self, hits, misses, duration, fallback=None):
+        latency = misses and duration / misses or None
+        saved = hits * (latency or fallback or 0.0)
+        return {
+            'hits': hits,
+            'misses': misses,
+            'hit_rate': (hits + misses) and float(hits) / (hits + misses),
+            'latency': latency,
+            'saved': saved,
+            'saved_latency': hits and saved / hits or None,
+        }
+
+    def info(self):
+        """Return statistics as dict.
+
+        ``hits`` and ``misses`` count cache lookups, ``latency`` is the
+        average response time of misses, ``saved`` the estimated time saved
+        by hits in seconds and ``saved_latency`` the average time saved per
+        hit. ``searches`` contains these values per ``(scope, baseDN)``.
+        Time saved by hits of searches without misses is estimated by the
+        overall average response time.
+        """
+        with self._lock:
+            searches = dict([(key, list(counters))
+                             for key, counters in self._searches.items()])
+        totals = [0, 0, 0.0]
+        for counters in searches.values():
+            totals = [total + value for total, value in zip(totals, counters)]
+        result = self._info(*totals)
+        fallback = result['latency']
+        info = dict()
+        saved = 0.0
+        for key, counters in searches.items():
+            info[key] = self._info(*counters, fallback=fallback)
+            saved += info[key]['saved']
+        # sum of estimates per search is more accurate than overall average
+        result['saved'] = saved
+        result['saved_latency'] = totals[0] and saved / totals[0] or None
+        result['searches'] = info
+        return result
+
+
+cache_stats = CacheStats()
+
+
+# BASE searches failed since the entry does not exist, see
+# ``negative_timeout`` of ``LDAPProps``. Kept in process memory like
+# ``cache_index``, which is used for invalidation.
+negative_cache = LocalCache(max_entries=10000)
+
+
+def normalize_dn(dn):
+    """Return normalized ``dn`` for comparison.
+    """
+    try:
+        return ldap.dn.dn2str(ldap.dn.str2dn(dn)).lower()
+    except ldap.DECODING_ERROR:
+        return dn.lower()
+
+
+_HEX_ESCAPE = re.compile(r'\\[0-9A-Fa-f]{2}')
+_OPERATORS = ('~', '>', '<')
+
+
+def _parse_filter(queryFilter, pos):
+    """parse filter starting at ``pos``. Return tuple containing the parsed
+    filter and the position after it.
+
+    Parsed filters are tuples, either ``('item', text)``, ``('!', filter)``,
+    ``('&', filters)`` or ``('|', filters)``. Nested filters of the same
+    operator get flattened.
+    """
+    if queryFilter[pos] != '(':
+        raise ValueError(u"Invalid filter")
+    operator = queryFilter[pos + 1]
+    if operator in ('&', '|'):
+        pos += 2
+        filters = list()
+        while queryFilter[pos] == '(':
+            parsed, pos = _parse_filter(queryFilter, pos)
+            if parsed[0] == operator:
+                filters.extend(parsed[1])
+            else:
+                filters.append(parsed)
+        if queryFilter[pos] != ')':
+            raise ValueError(u"Invalid filter")
+        return (operator, filters), pos + 1
+    if operator == '!':
+        parsed, pos = _parse_filter(queryFilter, pos + 2)
+        if queryFilter[pos] != ')':
+            raise ValueError(u"Invalid filter")
+        return ('!', parsed), pos + 1
+    end = queryFilter.index(')', pos)
+    item = queryFilter[pos + 1:end]
+    index = item.find('=')
+    if index < 1 or '(' in item:
+        raise ValueError(u"Invalid filter")
+    description = item[:index]
+    if description[-1] in _OPERATORS:
+        index -= 1
+        description = description[:-1]
+    # attribute descriptions and matching rules are case insensitive
+    value = _HEX_ESCAPE.sub(lambda match: match.group(0).lower(),
+                            item[index:])
+    return ('item', description.lower() + value), end + 1
+
+
+def _render_filter(parsed):
+    kind = parsed[0]
+    if kind == 'item':
+        return '(%s)' % parsed[1]
+    if kind == '!':
+        return '(!%s)' % _render_filter(parsed[1])
+    filters = sorted(set([_render_filter(child) for child in parsed[1]]))
+    if len(filters) == 1:
+        return filters[0]
+    return '(%s%s)' % (kind, ''.join(filters))
+
+
+_normalized_filters = dict()
+
+
+def normalize_filter(queryFilter, max_filters=10000):
+    """Return canonical form of LDAP ``queryFilter`` for cache keys.
+
+    Attribute descriptions get lowercased, operands of AND and OR filters
+    get flattened, deduplicated and sorted. Values are kept, since matching
+    rules might be case sensitive. Filters which cannot be parsed are
+    returned unchanged. Normalized filters are remembered up to
+    ``max_filters`` filters.
+    """
+    if not isinstance(queryFilter, basestring):
+        return queryFilter
+    normalized = _normalized_filters.get(queryFilter)
+    if normalized is not None:
+        return normalized
+    normalized = wrapped = queryFilter
+    if queryFilter and queryFilter[0] != '(':
+        wrapped = '(%s)' % queryFilter
+    try:
+        parsed, pos = _parse_filter(wrapped, 0)
+        if pos == len(wrapped):
+            normalized = _render_filter(parsed)
+    except (ValueError, IndexError):
+        pass
+    if len(_normalized_filters) >= max_filters:
+        _normalized_filters.clear()
+    _normalized_filters[queryFilter] = normalized
+    return normalized
+
+
+def search_tags(scope, baseDN, results):
+    """Return tags for cached search result.
+
+    Result is tagged by scope and base DN of the search and the DNs of the
+    returned entries.
+    """
+    tags = [(scope, normalize_dn(baseDN))]
+    tags += [('dn', normalize_dn(dn)) for dn, attrs in results if dn]
+    return tags
+
+
+def write_tags(dn):
+    """Return tags of cached search results affected by writing entry at
+    ``dn``.
+
+    These are BASE searches of the DN, ONELEVEL searches of the parent,
+    SUBTREE searches of the DN and its ancestors and results containing the
+    entry.
+    """
+    dn = normalize_dn(dn)
+    try:
+        rdns = ldap.dn.str2dn(dn)
+    except ldap.DECODING_ERROR:
+        return [(BASE, dn), ('dn', dn), (SUBTREE, dn)]
+    tags = [(BASE, dn), ('dn', dn)]
+    if len(rdns) > 1:
+        tags.append((ONELEVEL, ldap.dn.dn2str(rdns[1:])))
+    for i in range(len(rdns)):
+        tags.append((SUBTREE, ldap.dn.dn2str(rdns[i:])))
+    return tags
+
+
+class CacheIndex(object):
+    """Thread safe index of cache keys by tags.
+
+    Used for invalidating cached search results affected by write
+    operations. The index is kept in process memory, thus writes of other
+    processes do not invalidate entries of a shared cache backend.
+    """
+
+    def __init__(self, max_keys=100000):
+        """
+        max_keys
+            Maximum number of indexed keys. Least recently indexed keys are
+            dropped if exceeded.
+        """
+        self.max_keys = max_keys
+        self._tags = dict()
+        self._keys = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._keys)
+
+    def add(self, key, tags):
+        """Index ``key`` by ``tags``.
+
+        Return list of keys dropped from index due to ``max_keys``. Cached
+        entries of dropped keys must be removed, since they cannot be
+        invalidated any more.
+        """
+        with self._lock:
+            self._discard(key)
+            self._keys[key] = set(tags)
+            for tag in tags:
+                self._tags.setdefault(tag, set()).add(key)
+            dropped = list()
+            while len(self._keys) > self.max_keys:
+                dropped_key = iter(self._keys).next()
+                self._discard(dropped_key)
+                dropped.append(dropped_key)
+            return dropped
+
+    def pop(self, tags):
+        """Remove keys indexed by any of ``tags`` and return them.
+        """
+        with self._lock:
+            keys = set()
+            for tag in tags:
+                keys.update(self._tags.get(tag, ()))
+            for key in keys:
+                self._discard(key)
+            return keys
+
+    def clear(self):
+        with self._lock:
+            self._tags.clear()
+            self._keys.clear()
+
+    def _discard(self, key):
+        for tag in self._keys.pop(key, ()):
+            keys = self._tags[tag]
+            keys.discard(key)
+            if not keys:
+                del self._tags[tag]
+
+
+cache_index = CacheIndex()
+
+
+class _Flight(object):
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.waiting = 0
+        self.result = None
+        self.error = None
+
+
+class SingleFlight(object):
+    """Coalesce concurrent identical calls.
+
+    While a call for a key is in flight, further calls for the same key wait
+    for it and receive its result or exception instead of calling again.
+    """
+
+    def __init__(self):
+        self._flights = dict()
+        self._lock = threading.Lock()
+
+    def do(self, key, function, *args):
+        """Call ``function`` with ``args`` unless a call for ``key`` is in
+        flight, then wait for it and return its result.
+        """
+        with self._lock:
+            flight = self._flights.get(key)
+            follower = flight is not None
+            if follower:
+                flight.waiting += 1
+            else:
+                flight = self._flights[key] = _Flight()
+        if follower:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error[0], flight.error[1], flight.error[2]
+            return flight.result
+        try:
+            flight.result = function(*args)
+        except Exception:
+            flight.error = sys.exc_info()
+            raise
+        finally:
+            with self._lock:
+                del self._flights[key]
+            flight.done.set()
+        return flight.result
+
+    def waiting(self, key):
+        """Number of calls waiting for the call in flight for ``key``.
+        """
+        with self._lock:
+            flight = self._flights.get(key)
+            return flight is not None and flight.waiting or 0
+
+
+search_flight = SingleFlight()
+
+
+class CacheRefresher(object):
+    """Refresh stale cached search results in a background thread.
+
+    Keeps the time until which cached keys are considered fresh. Stale keys
+    are still served from cache while being refreshed. Like ``CacheIndex``,
+    freshness is kept in process memory, thus keys cached by other processes
+    are considered stale.
+    """
+
+    def __init__(self, max_keys=100000):
+        """
+        max_keys
+            Maximum number of keys freshness is kept for. Least recently
+            refreshed keys are dropped if exceeded.
+        """
+        self.max_keys = max_keys
+        self._fresh = OrderedDict()
+        self._pending = set()
+        self._queue = Queue.Queue()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+
+    def fresh(self, key, ttl):
+        """Consider ``key`` fresh for ``ttl`` seconds.
+        """
+        with self._lock:
+            self._fresh.pop(key, None)
+            self._fresh[key] = time.time() + ttl
+            while len(self._fresh) > self.max_keys:
+                self._fresh.popitem(last=False)
+
+    def stale(self, key):
+        """Flag whether ``key`` needs to be refreshed.
+        """
+        fresh = self._fresh.get(key)
+        return fresh is None or fresh <= time.time()
+
+    def refresh(self, key, function, *args):
+        """Call ``function`` with ``args`` in background unless a refresh of
+        ``key`` is already pending. Return whether refresh was scheduled.
+        """
+        with self._lock:
+            if key in self._pending:
+                return False
+            self._pending.add(key)
+            if self._thread is None or self._pid != os.getpid():
+                # worker thread does not survive a fork
+                self._pid = os.getpid()
+                self._thread = threading.Thread(target=self._run)
+                self._thread.daemon = True
+                self._thread.start()
+        self._queue.put((key, function, args))
+        return True
+
+    def join(self):
+        """Wait until all scheduled refreshes are done.
+        """
+        self._queue.join()
+
+    def _run(self):
+        while True:
+            key, function, args = self._queue.get()
+            try:
+                function(*args)
+            except Exception, e:
+                logger.error(u"Refreshing cached LDAP search failed: "
+                             u"%s" % (e,))
+            finally:
+                with self._lock:
+                    self._pending.discard(key)
+                self._queue.task_done()
+
+
+cache_refresher = CacheRefresher()
@@ -0,0 +1,127 @@
+# -*- coding: utf-8 -*-
+import threading
+import time
+
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+
+class ServerHealth(object):
+    """Health of an LDAP server.
+
+    Tracks response time and error rate as exponential moving averages and
+    acts as circuit breaker. After ``threshold`` consecutive failures the
+    circuit opens and the server is skipped. Once ``timeout`` seconds passed,
+    the circuit is half open and one request at a time probes the server
+    again, see ``acquire``. A successful probe closes the circuit, a failing
+    one opens it again.
+    """
+
+    weight = 0.3
+
+    def __init__(self, uri):
+        self.uri = uri
+        self.latency = None
+        self.error_rate = 0.0
+        self.failures = 0
+        self.opened = None
+        self.probing = None
+        self._lock = threading.Lock()
+
+    def state(self, timeout):
+        """Circuit state, one of ``CLOSED``, ``OPEN`` or ``HALF_OPEN``.
+        """
+        opened = self.opened
+        if opened is None:
+            return CLOSED
+        if time.time() - opened < timeout:
+            return OPEN
+        return HALF_OPEN
+
+    def available(self, timeout):
+        """Flag whether requests may be sent to server, i.e. circuit is
+        closed, or half open and not probed by another request.
+        """
+        state = self.state(timeout)
+        if state == HALF_OPEN:
+            return not self._probing(timeout)
+        return state == CLOSED
+
+    def acquire(self, timeout):
+        """Flag whether a request may be sent to server now. If circuit is
+        half open, the calling request gets flagged as the probe and further
+        requests are rejected until its result got recorded. A probe not
+        recorded within ``timeout`` seconds is given up.
+        """
+        with self._lock:
+            state = self.state(timeout)
+            if state != HALF_OPEN:
+                return state == CLOSED
+            if self._probing(timeout):
+                return False
+            self.probing = time.time()
+            return True
+
+    def _probing(self, timeout):
+        probing = self.probing
+        return probing is not None and time.time() - probing < timeout
+
+    def success(self, duration):
+        """Record response time of successful request.
+        """
+        with self._lock:
+            if self.latency is None:
+                self.latency = duration
+            else:
+                self.latency += self.weight * (duration - self.latency)
+            self.error_rate -= self.weight * self.error_rate
+            self.failures = 0
+            self.opened = None
+            self.probing = None
+
+    def failure(self, threshold):
+        """Record failed request. Open circuit if ``threshold`` consecutive
+        requests failed. 0 disables the circuit breaker.
+        """
+        with self._lock:
+            self.error_rate += self.weight * (1.0 - self.error_rate)
+            self.failures += 1
+            if self.probing is not None \
+              or (threshold and self.failures >= threshold):
+                # failed probe opens the circuit again
+                self.opened = time.time()
+            self.probing = None
+
+    def info(self, timeout):
+        """Return health information as dict.
+        """
+        return {
+            'uri': self.uri,
+            'state': self.state(timeout),
+            'latency': self.latency,
+            'error_rate': self.error_rate,
+            'failures': self.failures,
+        }
+
+
+_servers = dict()
+_servers_lock = threading.Lock()
+
+
+def server_health(uri):
+    """Return ``ServerHealth`` for ``uri``, shared between all connectors.
+    """
+    with _servers_lock:
+        health = _servers.get(uri)
+        if health is None:
+            health = _servers[uri] = ServerHealth(uri)
+        return health
+
+
+def reset_health():
+    """Forget health information of all servers.
+    """
+    with _servers_lock:
+        _servers.clear()
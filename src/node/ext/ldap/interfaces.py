@@ -3,6 +3,7 @@ from zope.interface import (
     Interface,
     Attribute,
 )
+from bda.cache.interfaces import ICacheProvider
 from node.interfaces import (
     IStorage,
     INodeCreatedEvent,
@@ -23,12 +24,38 @@ class ICacheProviderFactory(Interface):
         """
 
 
+class ILocalCacheProvider(ICacheProvider):
+    """In-process cache provider with bounded size and LRU eviction.
+    """
+
+    timeout = Attribute(u"Default time to live of entries in seconds. 0 "
+                        u"means entries do not expire")
+
+    evictions = Attribute(u"Number of entries evicted due to size limits")
+
+    def set(key, value, timeout=None):
+        """Store object to cache by given key, expiring after ``timeout``
+        seconds. If ``timeout`` is None, default timeout is used.
+        """
+
+    def get_multi(keys):
+        """Return dict containing the cached objects of ``keys`` found.
+        """
+
+    def set_multi(mapping, timeout=None):
+        """Store objects of ``mapping`` to cache by their keys, see
+        ``set``.
+        """
+
+
 class ILDAPProps(Interface):
     """LDAP properties configuration interface.
     """
 
     uri = Attribute(u"LDAP URI")
 
+    uris = Attribute(u"Ordered list of LDAP URIs used for failover")
+
     user = Attribute(u"LDAP User")
 
     password = Attribute(u"Bind Password")
@@ -47,7 +74,8 @@ class ILDAPProps(Interface):
 
     tls_clkeyfile = Attribute(u"Path to CL key file")
 
-    retry_max = Attribute(u"Retry count")
+    retry_max = Attribute(u"Maximum count of trials when connecting, each "
+                          u"trying all uris")
 
     retry_delay = Attribute(u"Retry delay in seconds")
 
@@ -55,6 +83,64 @@ class ILDAPProps(Interface):
 
     binary_attributes = Attribute(u"Attributes considered binary")
 
+    pool_size = Attribute(u"Maximum number of pooled connections. 0 disables "
+                          u"connection pooling")
+
+    pool_min_size = Attribute(u"Number of connections bound at pool creation")
+
+    pool_timeout = Attribute(u"Pooled connection checkout timeout in seconds")
+
+    pool_check = Attribute(u"Flag whether to check pooled connections on "
+                           u"checkout")
+
+    pool_check_idle = Attribute(u"Seconds a pooled connection must have been "
+                                u"unused before it gets checked on checkout")
+
+    pool_idle_timeout = Attribute(u"Seconds after which unused pooled "
+                                  u"connections get closed")
+
+    pool_max_lifetime = Attribute(u"Seconds after which pooled connections "
+                                  u"get replaced")
+
+    pool_keepalive = Attribute(u"Interval in seconds for checking idle pooled "
+                               u"connections in background")
+
+    page_size = Attribute(u"Page size for iterating search results")
+
+    page_prefetch = Attribute(u"Flag whether to prefetch next page while "
+                              u"iterating search results")
+
+    auth_pool_size = Attribute(u"Maximum number of pooled connections used "
+                               u"for credential checks. 0 disables pooling")
+
+    read_uris = Attribute(u"List of LDAP URIs of read replicas searches are "
+                          u"routed to")
+
+    read_routing = Attribute(u"Replica routing strategy, either "
+                             u"'round_robin' or 'latency'")
+
+    read_your_writes = Attribute(u"Seconds after a write in which searches "
+                                 u"of the session are routed to the writable "
+                                 u"server")
+
+    circuit_threshold = Attribute(u"Consecutive failures after which a "
+                                  u"server is skipped. 0 disables")
+
+    circuit_timeout = Attribute(u"Seconds a failing server is skipped before "
+                                u"being probed again")
+
+    load_balancing = Attribute(u"Flag whether to prefer the server with the "
+                               u"lowest response time")
+
+    cache_stale = Attribute(u"Seconds expired cached search results are "
+                            u"served while being refreshed. 0 disables")
+
+    cache_jitter = Attribute(u"Fraction by which cache timeout gets randomly "
+                             u"shortened when serving stale results")
+
+    negative_timeout = Attribute(u"Seconds inexistent entries are remembered "
+                                 u"for BASE searches. 0 disables")
+
 
 class ILDAPPrincipalsConfig(Interface):
     """LDAP principals configuration interface.
@@ -139,7 +225,8 @@ class ILDAPStorage(IStorage):
         """
 
     def search(queryFilter=None, criteria=None, relation=None,
-               attrlist=None, exact_match=False, or_search=False):
+               attrlist=None, exact_match=False, or_search=False,
+               sort_keys=None, offset=None, count=None):
         """Search the directors.
 
         All search criteria are additive and will be ``&``ed. ``queryFilter``
@@ -178,6 +265,34 @@ class ILDAPStorage(IStorage):
 
         or_search
             flag whether criteria should be ORer or ANDed. defaults to False.
+
+        sort_keys
+            list of attribute names the result gets sorted by on the server.
+            Prefix attribute name with '-' for reverse order.
+
+        offset
+            index of the first entry of the sorted result to return.
+
+        count
+            number of entries to return starting at ``offset``. If given,
+            ``sort_keys`` are required and the return format is a 2-tuple
+            containing the results and the estimated total count of entries.
+        """
+
+    def iter_search(queryFilter=None, criteria=None, relation=None,
+                    attrlist=None, or_search=False, page_size=None):
+        """Search the directory like ``search``, but yield the results as
+        they arrive from the server instead of returning a list. Results are
+        not cached.
+
+        page_size
+            If given, all pages of a paged search are walked. Defaults to
+            ``page_size`` of ``LDAPProps``.
+        """
+
+    def prefetch():
+        """Load attributes of all children with one search instead of one
+        search per child on first access of its ``attrs``.
         """
 
 
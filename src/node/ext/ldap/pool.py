@@ -0,0 +1,412 @@
+# -*- coding: utf-8 -*-
+import ldap
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+
+logger = logging.getLogger('node.ext.ldap')
+
+
+# connections inherited from the parent process after fork. python-ldap
+# unbinds connections when garbage collected, which would end the session of
+# the parent process sharing the socket, thus they are kept for the life of
+# the process.
+_inherited = list()
+
+
+def keep_inherited(con):
+    """Keep connection inherited from the parent process referenced for the
+    life of the process, without using or unbinding it.
+    """
+    _inherited.append(con)
+
+
+class LDAPConnectionPool(object):
+    """Thread safe, bounded pool of bound LDAP connections.
+    """
+
+    def __init__(self, factory, size, min_size=0, timeout=None, check=True,
+                 check_idle=30, idle_timeout=None, max_lifetime=None,
+                 keepalive=None):
+        """
+        factory
+            Callable returning a new bound LDAP connection.
+
+        size
+            Maximum number of connections handled by this pool.
+
+        min_size
+            Number of connections created at pool creation time.
+
+        timeout
+            Seconds to wait for a free connection if pool is exhausted. If
+            None, wait until a connection gets released.
+
+        check
+            Flag whether to check connection health on checkout.
+
+        check_idle
+            Seconds a connection must have been unused before it gets checked
+            on checkout. Recently used connections are assumed to be alive,
+            failing ones get discarded when raising ``ldap.SERVER_DOWN``.
+
+        idle_timeout
+            Seconds after which an unused connection gets closed. If None,
+            idle connections are kept.
+
+        max_lifetime
+            Seconds after which a connection gets closed, regardless of being
+            used. If None, connections are kept.
+
+        keepalive
+            Interval in seconds of a background thread keeping the pool in
+            shape, see ``maintain``. If None, no background thread is started.
+        """
+        self._factory = factory
+        self.size = size
+        self.min_size = min(min_size, size)
+        self.timeout = timeout
+        self.check = check
+        self.check_idle = check_idle
+        self.idle_timeout = idle_timeout
+        self.max_lifetime = max_lifetime
+        self.keepalive = keepalive
+        self._cond = threading.Condition(threading.Lock())
+        self._idle = list()
+        self._count = 0
+        self._created = dict()
+        self._used = dict()
+        self._pid = os.getpid()
+        self._closed = False
+        for i in range(self.min_size):
+            try:
+                con = self._create()
+            except ldap.LDAPError, e:
+                logger.warning(u"Cannot create pooled LDAP connection: "
+                               u"%s" % (e,))
+                break
+            self._idle.append(con)
+            self._count += 1
+        self._start_keepalive()
+
+    @property
+    def count(self):
+        """Number of connections currently handled by this pool.
+        """
+        return self._count
+
+    @property
+    def idle(self):
+        """Number of connections currently not in use.
+        """
+        return len(self._idle)
+
+    def acquire(self):
+        """Checkout a connection from pool.
+
+        Creates a new connection if no idle one is available and pool size
+        is not exceeded, otherwise wait for a connection to be released.
+        Raise ``ldap.TIMEOUT`` if no connection gets available within
+        ``self.timeout`` seconds.
+        """
+        self._check_fork()
+        deadline = None
+        if self.timeout is not None:
+            deadline = time.time() + self.timeout
+        while True:
+            con = None
+            self._cond.acquire()
+            try:
+                while not self._idle and self._count >= self.size:
+                    if deadline is None:
+                        self._cond.wait()
+                        continue
+                    remaining = deadline - time.time()
+                    if remaining <= 0:
+                        raise ldap.TIMEOUT({
+                            'desc': "No pooled LDAP connection available"})
+                    self._cond.wait(remaining)
+                if self._idle:
+                    con = self._idle.pop()
+                else:
+                    self._count += 1
+            finally:
+                self._cond.release()
+            if con is None:
+                try:
+                    return self._create()
+                except Exception:
+                    self._forget()
+                    raise
+            if self._expired(con):
+                logger.info(u"Discard expired pooled LDAP connection.")
+                self.discard(con)
+                continue
+            if not self._unchecked(con) or self._alive(con):
+                return con
+            logger.info(u"Discard dead pooled LDAP connection.")
+            self.discard(con)
+
+    def release(self, con):
+        """Return connection to pool.
+
+        Connections exceeding ``max_lifetime`` get closed.
+        """
+        if id(con) not in self._created:
+            # inherited from parent process, pool has been reset
+            keep_inherited(con)
+            return
+        if self._expired(con, idle=False):
+            self.discard(con)
+            return
+        self._cond.acquire()
+        try:
+            self._used[id(con)] = time.time()
+            self._idle.append(con)
+            self._cond.notify()
+        finally:
+            self._cond.release()
+
+    def discard(self, con):
+        """Close connection and remove it from pool.
+        """
+        if id(con) not in self._created:
+            # inherited from parent process, pool has been reset
+            keep_inherited(con)
+            return
+        try:
+            con.unbind_s()
+        except ldap.LDAPError:
+            pass
+        self._created.pop(id(con), None)
+        self._used.pop(id(con), None)
+        self._forget()
+
+    def maintain(self):
+        """Close expired idle connections, check idle connections not used
+        within ``keepalive`` seconds for health and discard dead ones, and
+        create connections up to ``min_size``.
+
+        Called periodically by the keepalive thread if ``keepalive`` is set.
+        Checking connections regularly keeps them from being dropped by
+        firewalls or server idle timeouts.
+        """
+        self._check_fork()
+        self._cond.acquire()
+        try:
+            idle = self._idle
+            self._idle = list()
+        finally:
+            self._cond.release()
+        keep = list()
+        now = time.time()
+        for con in idle:
+            if self._expired(con):
+                self.discard(con)
+            elif self.keepalive \
+              and now - self._used.get(id(con), 0) < self.keepalive:
+                keep.append(con)
+            elif self._alive(con):
+                keep.append(con)
+            else:
+                logger.info(u"Discard dead pooled LDAP connection.")
+                self.discard(con)
+        self._cond.acquire()
+        try:
+            self._idle = keep + self._idle
+            self._cond.notify_all()
+        finally:
+            self._cond.release()
+        while True:
+            self._cond.acquire()
+            try:
+                if self._closed or self._count >= self.min_size:
+                    return
+                self._count += 1
+            finally:
+                self._cond.release()
+            try:
+                con = self._create()
+            except ldap.LDAPError, e:
+                self._forget()
+                logger.warning(u"Cannot create pooled LDAP connection: "
+                               u"%s" % (e,))
+                return
+            self.release(con)
+
+    @contextmanager
+    def connection(self):
+        """Context manager for borrowing a connection.
+
+        Connections raising ``ldap.SERVER_DOWN`` are discarded, otherwise
+        the connection is released to the pool.
+        """
+        con = self.acquire()
+        discard = False
+        try:
+            yield con
+        except ldap.SERVER_DOWN:
+            discard = True
+            raise
+        finally:
+            if discard:
+                self.discard(con)
+            else:
+                self.release(con)
+
+    def close(self):
+        """Close all idle connections and stop keepalive thread.
+        """
+        self._closed = True
+        self._cond.acquire()
+        try:
+            idle = self._idle
+            self._idle = list()
+        finally:
+            self._cond.release()
+        for con in idle:
+            self.discard(con)
+
+    def _forget(self):
+        self._cond.acquire()
+        try:
+            self._count -= 1
+            self._cond.notify()
+        finally:
+            self._cond.release()
+
+    def _create(self):
+        con = self._factory()
+        self._created[id(con)] = self._used[id(con)] = time.time()
+        return con
+
+    def _expired(self, con, idle=True):
+        now = time.time()
+        if self.max_lifetime is not None \
+          and now - self._created.get(id(con), now) >= self.max_lifetime:
+            return True
+        if idle and self.idle_timeout is not None \
+          and now - self._used.get(id(con), now) >= self.idle_timeout:
+            return True
+        return False
+
+    def _unchecked(self, con):
+        """Flag whether connection needs a health check on checkout.
+        """
+        if not self.check:
+            return False
+        used = self._used.get(id(con))
+        return used is None or time.time() - used >= self.check_idle
+
+    def _check_fork(self):
+        """Forget connections inherited from the parent process after fork.
+
+        Their sockets are shared with the parent process, so they are neither
+        used nor unbound but kept referenced for the life of the process,
+        see ``keep_inherited``.
+        """
+        pid = os.getpid()
+        if pid == self._pid:
+            return
+        logger.info(u"Process forked, reset LDAP connection pool.")
+        for con in self._idle:
+            keep_inherited(con)
+        self._pid = pid
+        self._cond = threading.Condition(threading.Lock())
+        self._idle = list()
+        self._count = 0
+        self._created = dict()
+        self._used = dict()
+        self._start_keepalive()
+
+    def _start_keepalive(self):
+        if not self.keepalive or self._closed:
+            return
+        thread = threading.Thread(target=self._keepalive_loop,
+                                  name='LDAP connection pool keepalive')
+        thread.daemon = True
+        thread.start()
+
+    def _keepalive_loop(self):
+        pid = os.getpid()
+        while True:
+            time.sleep(self.keepalive)
+            if self._closed or os.getpid() != pid:
+                return
+            try:
+                self.maintain()
+            except Exception, e:
+                logger.error(u"LDAP connection pool maintenance failed: "
+                             u"%s" % (e,))
+
+    def _alive(self, con):
+        try:
+            con.search_s('', ldap.SCOPE_BASE, '(objectClass=*)', ['1.1'])
+        except ldap.LDAPError:
+            return False
+        return True
+
+
+_pools = dict()
+_pools_lock = threading.Lock()
+
+
+def _shared_pool(key, factory, size, connector):
+    _pools_lock.acquire()
+    try:
+        pool = _pools.get(key)
+        if pool is None:
+            pool = _pools[key] = LDAPConnectionPool(
+                factory,
+                size,
+                min_size=connector._pool_min_size,
+                timeout=connector._pool_timeout,
+                check=connector._pool_check,
+                check_idle=connector._pool_check_idle,
+                idle_timeout=connector._pool_idle_timeout,
+                max_lifetime=connector._pool_max_lifetime,
+                keepalive=connector._pool_keepalive)
+        return pool
+    finally:
+        _pools_lock.release()
+
+
+def connection_pool(connector):
+    """Return the connection pool for given ``LDAPConnector``.
+
+    Pools are shared between all connectors with equal server and
+    credentials settings.
+    """
+    key = (tuple(connector._uris),
+           connector._bindDN,
+           connector._bindPW,
+           connector._start_tls)
+    return _shared_pool(key, connector.connect, connector._pool_size,
+                        connector)
+
+
+def authentication_pool(connector):
+    """Return the pool of unbound connections used for verifying credentials
+    for given ``LDAPConnector``.
+
+    Pools are shared between all connectors with equal server settings.
+    """
+    key = ('authentication', tuple(connector._uris), connector._start_tls)
+    factory = lambda: connector.connect(bind=False)
+    return _shared_pool(key, factory, connector._auth_pool_size, connector)
+
+
+def close_pools():
+    """Close and remove all shared connection pools.
+    """
+    _pools_lock.acquire()
+    try:
+        pools = _pools.values()
+        _pools.clear()
+    finally:
+        _pools_lock.release()
+    for pool in pools:
+        pool.close()
@@ -50,6 +50,27 @@ class LDAPServerProperties(object):
                  retry_delay=10.0,
                  multivalued_attributes=MULTIVALUED_DEFAULTS,
                  binary_attributes=BINARY_DEFAULTS,
+                 pool_size=0,
+                 pool_min_size=0,
+                 pool_timeout=None,
+                 pool_check=True,
+                 pool_check_idle=30,
+                 pool_idle_timeout=None,
+                 pool_max_lifetime=None,
+                 pool_keepalive=None,
+                 auth_pool_size=0,
+                 uris=None,
+                 page_size=None,
+                 page_prefetch=False,
+                 read_uris=None,
+                 read_routing='round_robin',
+                 read_your_writes=0,
+                 circuit_threshold=0,
+                 circuit_timeout=30.0,
+                 load_balancing=False,
+                 cache_stale=0,
+                 cache_jitter=0.0,
+                 negative_timeout=0,
                  ):
         """Take the connection properties as arguments.
 
@@ -81,6 +102,10 @@ class LDAPServerProperties(object):
                   enforce, see start_tls)
                 - ldaps://<server>:<port>
 
+        uris
+            Ordered list of LDAP URIs to fail over to. ``uri`` is tried
+            first, it defaults to the first of ``uris``.
+
         start_tls
             Determines if StartTLS extended operation is tried on
             a LDAPv3 server, if the LDAP URL scheme is ldap:. If LDAP URL
@@ -103,12 +128,14 @@ class LDAPServerProperties(object):
             Not yet
 
         retry_max
-            Maximum count of reconnect trials
-            Not yet
+            Maximum count of trials when connecting. All ``uris`` are tried
+            in order per trial. Read operations failing due to a lost
+            connection are retried once on a new connection, connecting
+            takes up to ``retry_max`` trials as well.
 
         retry_delay
-            Time span to wait between two reconnect trials
-            Not yet
+            Time span to wait between two reconnect trials. Delay gets doubled
+            on each further trial.
 
         multivalued_attributes
             Set of attributes names considered as multivalued to be returned
@@ -117,13 +144,102 @@ class LDAPServerProperties(object):
         binary_attributes
             Set of attributes names considered as binary.
             (no unicode conversion)
+
+        pool_size
+            Maximum number of pooled connections. If 0, connection pooling is
+            disabled and each session binds a dedicated connection.
+
+        pool_min_size
+            Number of connections bound when the pool gets created.
+
+        pool_timeout
+            Seconds to wait for a free pooled connection if pool is exhausted.
+            If None, wait until a connection gets released.
+
+        pool_check
+            Flag whether to check pooled connections for health on checkout.
+
+        pool_check_idle
+            Seconds a pooled connection must have been unused before it gets
+            checked on checkout. Saves the round trip for connections in
+            frequent use.
+
+        pool_idle_timeout
+            Seconds after which unused pooled connections get closed. If None,
+            idle connections are kept open.
+
+        pool_max_lifetime
+            Seconds after which pooled connections get closed and replaced.
+            If None, connections are kept open.
+
+        pool_keepalive
+            Interval in seconds in which a background thread checks idle
+            pooled connections, replaces dead and expired ones and keeps
+            ``pool_min_size`` connections open. If None, disabled.
+
+        auth_pool_size
+            Maximum number of pooled connections used for verifying
+            credentials in ``LDAPSession.authenticate``. These connections are
+            re-bound for each credential check. If 0, a new connection is
+            created per check. ``pool_timeout`` and ``pool_check`` apply.
+
+        read_uris
+            List of LDAP URIs of read replicas. If given, searches are routed
+            to the replicas while write operations and credential checks go
+            to ``uri``. Replicas fail over to ``uris``.
+
+        read_routing
+            Strategy for choosing the replica per search. Either
+            'round_robin' or 'latency', which prefers the replica with the
+            lowest observed response time.
+
+        read_your_writes
+            Seconds after a write operation of a session in which searches of
+            this session are routed to ``uri`` and bypass the cache, so changes
+            are visible before being replicated. 0 disables.
+
+        circuit_threshold
+            Number of consecutive failures after which a server is considered
+            down and skipped when connecting. 0 disables circuit breaking.
+
+        circuit_timeout
+            Seconds a server is skipped after being considered down. Then the
+            server gets probed by the next connection attempt.
+
+        load_balancing
+            Flag whether to connect to the server with the lowest observed
+            response time instead of trying ``uris`` in configured order.
+
+        cache_stale
+            Seconds cached search results are still served after ``timeout``
+            expired. The first search hitting an expired result triggers a
+            refresh in background. 0 disables.
+
+        cache_jitter
+            Fraction by which ``timeout`` gets randomly shortened per cached
+            search result if ``cache_stale`` is set, e.g. 0.1 for up to 10%.
+            Avoids results cached at once from expiring at once.
+
+        negative_timeout
+            Seconds BASE searches for inexistent entries fail without asking
+            the server again, e.g. when resolving dangling member DNs. Adding
+            the entry in this process ends this immediately. Applies if
+            caching is disabled as well. 0 disables.
         """
+        if uri is None and uris:
+            uri = uris[0]
         if uri is None:
             # old school
             self.server = server or 'localhost'
             self.port = port or 389
             uri = "ldap://%s:%d/" % (self.server, self.port)
         self.uri = uri
+        uris = list(uris or [])
+        if uri not in uris:
+            uris.insert(0, uri)
+        self.uris = uris
+        self.page_size = page_size
+        self.page_prefetch = page_prefetch
         self.user = user
         self.password = password
         self.cache = cache
@@ -137,5 +253,23 @@ class LDAPServerProperties(object):
         self.retry_delay = retry_delay
         self.multivalued_attributes = multivalued_attributes
         self.binary_attributes = binary_attributes
+        self.pool_size = pool_size
+        self.pool_min_size = pool_min_size
+        self.pool_timeout = pool_timeout
+        self.pool_check = pool_check
+        self.pool_check_idle = pool_check_idle
+        self.pool_idle_timeout = pool_idle_timeout
+        self.pool_max_lifetime = pool_max_lifetime
+        self.pool_keepalive = pool_keepalive
+        self.auth_pool_size = auth_pool_size
+        self.read_uris = list(read_uris or [])
+        self.read_routing = read_routing
+        self.read_your_writes = read_your_writes
+        self.circuit_threshold = circuit_threshold
+        self.circuit_timeout = circuit_timeout
+        self.load_balancing = load_balancing
+        self.cache_stale = cache_stale
+        self.cache_jitter = cache_jitter
+        self.negative_timeout = negative_timeout
 
 LDAPProps = LDAPServerProperties
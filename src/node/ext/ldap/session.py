@@ -1,11 +1,17 @@
 # -*- coding: utf-8 -*-
 import ldap
+import logging
+import time
 from . import (
     BASE,
     LDAPConnector,
     LDAPCommunicator,
 )
 from .base import testLDAPConnectivity
+from .health import server_health
+
+
+logger = logging.getLogger('node.ext.ldap')
 
 
 class LDAPSession(object):
@@ -18,6 +24,18 @@ class LDAPSession(object):
         self._props = props
         connector = LDAPConnector(props=props)
         self._communicator = LDAPCommunicator(connector)
+        # communicators of read replicas, fail over to writable servers
+        self._readers = list()
+        for uri in getattr(props, 'read_uris', None) or []:
+            reader = LDAPConnector(props=props, uris=[uri] + connector._uris)
+            self._readers.append(LDAPCommunicator(reader))
+        self._read_index = 0
+        self._paged_reader = None
+        self._last_write = None
+        if connector._pool_size:
+            # warm up shared connection pools
+            for communicator in [self._communicator] + self._readers:
+                communicator.bind()
 
     def checkServerProperties(self):
         """Test if connection can be established.
@@ -35,54 +53,193 @@ class LDAPSession(object):
     def _set_baseDN(self, baseDN):
         """baseDN must be utf8-encoded.
         """
-        self._communicator.baseDN = baseDN
+        for communicator in [self._communicator] + self._readers:
+            communicator.baseDN = baseDN
 
     baseDN = property(_get_baseDN, _set_baseDN)
 
+    @property
+    def page_size(self):
+        """Default page size for ``iter_search``.
+        """
+        return getattr(self._props, 'page_size', None)
+
     def ensure_connection(self):
-        """If LDAP directory is down, bind again and retry given function.
+        """Bind if not bound yet or if connection has been lost.
 
-        XXX: * Improve retry logic
-             * Extend LDAPSession object to handle Fallback server(s)
+        Binding fails over to the configured ``uris``, see
+        ``LDAPConnector.connect``.
         """
-        if self._communicator._con is None:
+        if not self._communicator.bound:
             self._communicator.bind()
 
+    def health(self):
+        """Return health information of the servers used by this session,
+        see ``node.ext.ldap.base.LDAPConnector.health``.
+        """
+        infos = list()
+        seen = set()
+        for communicator in [self._communicator] + self._readers:
+            for info in communicator._connector.health():
+                if info['uri'] not in seen:
+                    seen.add(info['uri'])
+                    infos.append(info)
+        return infos
+
+    def cache_stats(self):
+        """Return statistics of cached searches, see
+        ``node.ext.ldap.base.LDAPCommunicator.cache_stats``.
+        """
+        return self._communicator.cache_stats()
+
+    def _reader(self):
+        """Return the communicator to use for the next read operation.
+
+        Searches are routed to the read replicas configured by ``read_uris``
+        due to ``read_routing``, or to the writable server if no replicas are
+        configured or a write of this session happened within the last
+        ``read_your_writes`` seconds. The returned communicator is bound.
+        """
+        if not self._readers or self._recently_written():
+            reader = self._communicator
+        elif getattr(self._props, 'read_routing', None) == 'latency':
+            # response time of server operations, cache hits are not
+            # measured. replicas not measured yet are tried first
+            reader = min(self._readers, key=lambda r: server_health(
+                r._connector._uri).latency or 0.0)
+        else:
+            reader = self._readers[self._read_index % len(self._readers)]
+            self._read_index += 1
+        if not reader.bound:
+            reader.bind()
+        return reader
+
+    def _recently_written(self):
+        """Flag whether a write of this session happened within the last
+        ``read_your_writes`` seconds.
+        """
+        window = getattr(self._props, 'read_your_writes', 0)
+        return bool(window and self._last_write is not None
+                    and time.time() - self._last_write < window)
+
+    def _fresh(self):
+        """Flag whether cached search results must not be used, as they might
+        have been fetched from a replica not containing the recent writes of
+        this session.
+        """
+        return bool(self._readers) and self._recently_written()
+
+    def _written(self):
+        self._last_write = time.time()
+
+    def _retry(self, function, *args):
+        """Call ``function`` and retry once if the connection to the server
+        has been lost.
+
+        The retry binds a new connection, which already tries up to
+        ``retry_max`` times, see ``LDAPConnector.connect``. Only use for
+        idempotent operations.
+        """
+        try:
+            return function(*args)
+        except ldap.SERVER_DOWN, e:
+            logger.warning(u"LDAP connection lost, retry operation: "
+                           u"%s" % (e,))
+        return function(*args)
+
     def search(self, queryFilter='(objectClass=*)', scope=BASE, baseDN=None,
                force_reload=False, attrlist=None, attrsonly=0,
-               page_size=None, cookie=None):
+               page_size=None, cookie=None, sort_keys=None, offset=None,
+               count=None):
         if queryFilter in ('', u'', None):
             # It makes no sense to really pass these to LDAP, therefore, we
             # interpret them as "don't filter" which in LDAP terms is
             # '(objectClass=*)'
             queryFilter = '(objectClass=*)'
-        self.ensure_connection()
-        res = self._communicator.search(queryFilter, scope, baseDN,
-                                        force_reload, attrlist, attrsonly,
-                                        page_size, cookie)
+        force_reload = force_reload or self._fresh()
+        args = (queryFilter, scope, baseDN, force_reload, attrlist, attrsonly,
+                page_size, cookie, sort_keys, offset, count)
+        if cookie:
+            # paged results cookie is bound to the connection it was issued,
+            # retry on a new connection is pointless.
+            reader = self._paged_reader or self._communicator
+            if not reader.bound:
+                reader.bind()
+            res = reader.search(*args)
+        else:
+            reader = self._reader()
+            res = self._retry(reader.search, *args)
         if page_size:
+            self._paged_reader = reader
             res, cookie = res
+        elif count is not None:
+            res, total = res
         # ActiveDirectory returns entries with dn None, which can be ignored
         res = filter(lambda x: x[0] is not None, res)
         if page_size:
             return res, cookie
+        elif count is not None:
+            return res, total
         return res
 
+    def search_entries(self, dns, attrlist=None, force_reload=False):
+        """Fetch the entries at ``dns``. Return list of ``(dn, attrs)``
+        tuples in order of ``dns``, inexistent entries are omitted.
+
+        Cached entries are looked up at once and entries not cached are
+        fetched with combined searches, see
+        ``node.ext.ldap.base.LDAPCommunicator.search_entries``.
+        """
+        force_reload = force_reload or self._fresh()
+        reader = self._reader()
+        return self._retry(reader.search_entries, dns, attrlist, force_reload)
+
+    def iter_search(self, queryFilter='(objectClass=*)', scope=BASE,
+                    baseDN=None, attrlist=None, attrsonly=0, page_size=None):
+        """Search the directory and yield ``(dn, attrs)`` tuples as entries
+        arrive from the server. Results are not cached.
+
+        If ``page_size`` is not given, ``page_size`` of ``LDAPProps`` is used.
+        If a page size is set, all pages of a paged search are walked
+        internally, optionally prefetching the next page if ``page_prefetch``
+        is set on ``LDAPProps``.
+
+        If the connection is lost before the first entry has been received,
+        the search is retried once like ``search``.
+        """
+        if queryFilter in ('', u'', None):
+            queryFilter = '(objectClass=*)'
+        if page_size is None:
+            page_size = self.page_size
+        prefetch = getattr(self._props, 'page_prefetch', False)
+        args = (queryFilter, scope, baseDN, attrlist, attrsonly, page_size,
+                prefetch)
+        retried = False
+        while True:
+            received = False
+            try:
+                for dn, attrs in self._reader().iter_search(*args):
+                    received = True
+                    # ActiveDirectory returns entries with dn None
+                    if dn is not None:
+                        yield dn, attrs
+                return
+            except ldap.SERVER_DOWN, e:
+                if received or retried:
+                    raise
+                retried = True
+                logger.warning(u"LDAP connection lost, retry operation: "
+                               u"%s" % (e,))
+
     def add(self, dn, data):
         self.ensure_connection()
         self._communicator.add(dn, data)
+        self._written()
 
     def authenticate(self, dn, pw):
         """Verify credentials, but don't rebind the session to that user
         """
-        # Let's bypass connector/communicator until they are sorted out
-        con = ldap.initialize(self._props.uri)
-        try:
-            con.simple_bind_s(dn, pw)
-        except ldap.INVALID_CREDENTIALS:
-            return False
-        else:
-            return True
+        return self._retry(self._communicator.authenticate, dn, pw)
 
     def modify(self, dn, data, replace=False):
         """Modify an existing entry in the directory.
@@ -101,15 +258,40 @@ class LDAPSession(object):
         """
         self.ensure_connection()
         result = self._communicator.modify(dn, data)
+        self._written()
         return result
 
     def delete(self, dn):
+        self.ensure_connection()
         self._communicator.delete(dn)
+        self._written()
+
+    def cache_entry(self, dn, attrs, attrlist=['*']):
+        """Store ``attrs`` as cached result of the BASE search for ``dn``,
+        see ``node.ext.ldap.base.LDAPCommunicator.cache_entry``.
+        """
+        for communicator in [self._communicator] + self._readers:
+            communicator.cache_entry(dn, attrs, attrlist=attrlist)
+
+    def batch(self, operations, window=None):
+        """Execute write operations pipelined on one connection.
+
+        See ``node.ext.ldap.base.LDAPCommunicator.batch``.
+        """
+        self.ensure_connection()
+        try:
+            return self._communicator.batch(operations, window=window)
+        finally:
+            self._written()
 
     def passwd(self, userdn, oldpw, newpw):
         self.ensure_connection()
         result = self._communicator.passwd(userdn, oldpw, newpw)
+        self._written()
         return result
 
     def unbind(self):
         self._communicator.unbind()
+        for reader in self._readers:
+            if reader.bound:
+                reader.unbind()
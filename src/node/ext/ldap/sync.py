@@ -0,0 +1,257 @@
+# -*- coding: utf-8 -*-
+import ldap
+import logging
+import threading
+import time
+from ldap.ldapobject import SimpleLDAPObject
+from .base import (
+    LDAPCommunicator,
+    LDAPConnector,
+)
+from .health import server_health
+from .scope import SUBTREE
+try:
+    from ldap.syncrepl import SyncreplConsumer
+except ImportError:                                         #pragma NO COVERAGE
+    # python-ldap < 2.4.10 or pyasn1 missing                #pragma NO COVERAGE
+    SyncreplConsumer = None                                 #pragma NO COVERAGE
+
+
+logger = logging.getLogger('node.ext.ldap')
+
+
+class SyncConnection(SimpleLDAPObject, SyncreplConsumer or object):
+    """LDAP connection running a content synchronization (RFC 4533) search.
+
+    Synchronization events are delegated to the ``SyncListener``.
+    """
+
+    def __init__(self, uri, listener):
+        SimpleLDAPObject.__init__(self, uri)
+        self._listener = listener
+
+    def syncrepl_get_cookie(self):
+        return self._listener.cookie
+
+    def syncrepl_set_cookie(self, cookie):
+        self._listener.cookie = cookie
+
+    def syncrepl_entry(self, dn, attrs, uuid):
+        self._listener._changed(dn, uuid)
+
+    def syncrepl_delete(self, uuids):
+        self._listener._deleted(uuids)
+
+    def syncrepl_present(self, uuids, refreshDeletes=False):
+        self._listener._present(uuids, refreshDeletes)
+
+    def syncrepl_refreshdone(self):
+        self._listener._refreshdone()
+
+
+class SyncListener(object):
+    """Keep cached search results consistent with the directory.
+
+    Runs a content synchronization search in ``refreshAndPersist`` mode on a
+    dedicated connection in a background thread. Cached search results
+    affected by entries added, modified, renamed or deleted by any client
+    get removed from the cache as the server reports the change, thus cache
+    timeouts can be long without serving outdated results.
+
+    Requires the ``syncprov`` overlay on the server and ``ldap.syncrepl``,
+    which is available with python-ldap >= 2.4.10 and pyasn1.
+
+    The cache index is per process, so each process needs its own listener.
+    Changes made before the listener completed the initial refresh are not
+    noticed, see ``wait``.
+
+    Deleted entries are reported by UUID only, thus the DNs of all
+    synchronized entries are kept in memory. Memory usage grows with the
+    number of entries matching ``baseDN``, ``scope`` and ``queryFilter``,
+    which should be narrowed accordingly for large directories.
+    """
+
+    def __init__(self, props, baseDN, scope=SUBTREE,
+                 queryFilter='(objectClass=*)', callback=None,
+                 poll_timeout=1.0):
+        """
+        props
+            ``LDAPProps`` instance. Connection and cache settings are taken
+            from it.
+
+        baseDN
+            Base DN of synchronized entries.
+
+        scope
+            Scope of synchronized entries.
+
+        queryFilter
+            Filter of synchronized entries.
+
+        callback
+            Optional callable called with the DN of each changed entry after
+            invalidating affected cached results.
+
+        poll_timeout
+            Seconds to wait for synchronization events before checking
+            whether the listener got stopped.
+        """
+        if SyncreplConsumer is None:
+            raise RuntimeError(                             #pragma NO COVERAGE
+                u"Cache synchronization requires "          #pragma NO COVERAGE
+                u"python-ldap >= 2.4.10 and pyasn1")        #pragma NO COVERAGE
+        self.baseDN = baseDN
+        self.scope = scope
+        self.queryFilter = queryFilter
+        self.callback = callback
+        self.poll_timeout = poll_timeout
+        self.cookie = None
+        self._connector = LDAPConnector(props=props)
+        self._communicator = LDAPCommunicator(self._connector)
+        self._dns = dict()
+        self._present_uuids = set()
+        self._resumed = False
+        self._refreshed = threading.Event()
+        self._stopped = threading.Event()
+        self._thread = None
+
+    @property
+    def running(self):
+        """Flag whether the listener thread is running.
+        """
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        """Start listening in a background thread.
+        """
+        if self.running:
+            return
+        self._stopped.clear()
+        self._thread = threading.Thread(target=self._run,
+                                        name='node.ext.ldap.sync')
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self, timeout=None):
+        """Stop listening and wait up to ``timeout`` seconds for the thread
+        to terminate.
+        """
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def wait(self, timeout=None):
+        """Wait up to ``timeout`` seconds until the initial refresh
+        completed. Return whether it completed.
+        """
+        self._refreshed.wait(timeout)
+        return self._refreshed.is_set()
+
+    def invalidate(self, dn):
+        """Remove cached search results affected by a change of the entry
+        at ``dn``.
+        """
+        self._communicator.invalidate(dn)
+        if self.callback is not None:
+            self.callback(dn)
+
+    def _run(self):
+        delay = self._connector._retry_delay or self.poll_timeout
+        while not self._stopped.is_set():
+            try:
+                self._listen()
+            except ldap.SERVER_DOWN, e:
+                logger.warning(u"Cache synchronization connection "
+                               u"lost: %s" % e)
+            except ldap.LDAPError, e:
+                # e.g. cookie rejected, start over with full refresh
+                logger.warning(u"Cache synchronization failed: %s" % e)
+                self._reset()
+            self._stopped.wait(delay)
+
+    def _listen(self):
+        con = self._connect()
+        try:
+            # refresh after reconnect reports changes since the cookie
+            self._resumed = self.cookie is not None
+            self._present_uuids = set()
+            msgid = con.syncrepl_search(self.baseDN, self.scope,
+                                        mode='refreshAndPersist',
+                                        filterstr=self.queryFilter,
+                                        attrlist=['1.1'])
+            while not self._stopped.is_set():
+                try:
+                    if not con.syncrepl_poll(msgid=msgid,
+                                             timeout=self.poll_timeout):
+                        return
+                except ldap.TIMEOUT:
+                    continue
+        finally:
+            try:
+                con.unbind_s()
+            except ldap.LDAPError:                          #pragma NO COVERAGE
+                pass                                        #pragma NO COVERAGE
+
+    def _connect(self):
+        connector = self._connector
+        error = None
+        for uri in connector._candidates():
+            if not server_health(uri).acquire(connector._circuit_timeout):
+                continue
+            con = SyncConnection(uri, self)
+            con.protocol_version = connector.protocol
+            start = time.time()
+            try:
+                if connector._start_tls:
+                    con.start_tls_s()                       #pragma NO COVERAGE
+                con.simple_bind_s(connector._bindDN, connector._bindPW)
+                connector.observe(uri, time.time() - start)
+                return con
+            except ldap.SERVER_DOWN, error:
+                connector.observe(uri)
+                logger.warning(u"LDAP server at '%s' unavailable: %s" % (
+                    uri, error))
+        if error is None:
+            error = ldap.SERVER_DOWN({                      #pragma NO COVERAGE
+                'desc': "All LDAP servers unavailable, circuit open"})
+        raise error
+
+    def _reset(self):
+        """Drop synchronization state, all known entries are considered
+        changed.
+        """
+        self.cookie = None
+        dns = self._dns.values()
+        self._dns = dict()
+        for dn in dns:
+            self.invalidate(dn)
+
+    def _changed(self, dn, uuid):
+        previous = self._dns.get(uuid)
+        self._dns[uuid] = dn
+        if previous is not None and previous != dn:
+            # renamed or moved
+            self.invalidate(previous)
+        # initial refresh reports all entries, not changes
+        if self._refreshed.is_set() or self._resumed:
+            self.invalidate(dn)
+
+    def _deleted(self, uuids):
+        for uuid in uuids:
+            dn = self._dns.pop(uuid, None)
+            if dn is not None:
+                self.invalidate(dn)
+
+    def _present(self, uuids, refreshDeletes):
+        if uuids is not None:
+            self._present_uuids.update(uuids)
+            return
+        if not refreshDeletes:
+            # end of present phase, entries not present have been deleted
+            self._deleted([uuid for uuid in self._dns.keys()
+                           if uuid not in self._present_uuids])
+        self._present_uuids = set()
+
+    def _refreshdone(self):
+        self._refreshed.set()
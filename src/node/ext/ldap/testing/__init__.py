@@ -72,8 +72,11 @@ rootpw		%(bindpw)s
 directory	%(dbdir)s
 # Indices to maintain
 index	objectClass	eq
+index	entryCSN,entryUUID	eq
 
 overlay memberof
+overlay sssvlv
+overlay syncprov
 """
 
 
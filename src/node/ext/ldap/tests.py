@@ -13,6 +13,9 @@ DOCFILES = [
     ('cache.rst', testing.LDIF_data),
     ('base.rst', testing.LDIF_data),
     ('session.rst', testing.LDIF_data),
+    ('pool.rst', testing.LDIF_data),
+    ('asyncsession.rst', testing.LDIF_data),
+    ('sync.rst', testing.LDIF_data),
     ('filter.rst', testing.LDIF_data),
     ('_node.rst', testing.LDIF_data),
     ('schema.rst', testing.LDIF_data),
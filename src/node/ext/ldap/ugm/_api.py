@@ -470,6 +470,8 @@ class LDAPPrincipals(OdictStorage):
                 raise KeyError(dn)
             search = self.context.ldap_session.search
             try:
+                # dangling DNs fail without server round trip for
+                # ``negative_timeout`` seconds if set on ``LDAPProps``
                 dn = search(baseDN=dn.encode('utf-8'))[0][0]
             except ldap.NO_SUCH_OBJECT:
                 raise KeyError(dn)
@@ -596,10 +598,24 @@ class LDAPPrincipals(OdictStorage):
             [(unalias(key), val) for key, val in dct.iteritems()])
         return unaliased_dct
 
+    @default
+    def _unalias_sort_keys(self, sort_keys):
+        if sort_keys is None:
+            return None
+        # sort keys look like '[-]<attr>[:<ordering rule>]'
+        unalias = self.principal_attraliaser.unalias
+        ret = list()
+        for key in sort_keys:
+            prefix = key.startswith('-') and '-' or ''
+            attr, sep, rule = key.lstrip('-').partition(':')
+            ret.append('%s%s%s%s' % (prefix, unalias(attr), sep, rule))
+        return ret
+
     @default
     def search(self, criteria=None, attrlist=None,
                exact_match=False, or_search=False, or_keys=None,
-               or_values=None, page_size=None, cookie=None):
+               or_values=None, page_size=None, cookie=None,
+               sort_keys=None, offset=None, count=None):
         results = self.context.search(
             criteria=self._unalias_dict(criteria),
             attrlist=self._unalias_list(attrlist),
@@ -608,16 +624,42 @@ class LDAPPrincipals(OdictStorage):
             or_keys=or_keys,
             or_values=or_values,
             page_size=page_size,
-            cookie=cookie
+            cookie=cookie,
+            sort_keys=self._unalias_sort_keys(sort_keys),
+            offset=offset,
+            count=count
             )
+        total = None
         if type(results) is tuple:
-            results, cookie = results
+            if count is not None:
+                results, total = results
+            else:
+                results, cookie = results
         if attrlist is not None:
             results = [(uid, self._alias_dict(att)) for uid, att in results]
         if cookie is not None:
             return results, cookie
+        if total is not None:
+            return results, total
         return results
 
+    @default
+    def iter_search(self, criteria=None, attrlist=None, or_search=False,
+                    or_keys=None, or_values=None, page_size=None):
+        results = self.context.iter_search(
+            criteria=self._unalias_dict(criteria),
+            attrlist=self._unalias_list(attrlist),
+            or_search=or_search,
+            or_keys=or_keys,
+            or_values=or_values,
+            page_size=page_size
+            )
+        for result in results:
+            if attrlist is not None:
+                uid, att = result
+                result = (uid, self._alias_dict(att))
+            yield result
+
     @default
     @locktree
     def create(self, pid, **kw):